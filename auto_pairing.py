@@ -0,0 +1,134 @@
+import os
+import re
+import difflib
+import collections
+
+# Filename based video/subtitle matching for "Pair All Automatically" and the CLI.
+# Both lists are parsed once and subtitles are indexed by normalized name and by
+# (season, episode), so each video is only compared against the few subtitles that
+# share its episode number instead of against every subtitle.
+
+FileInfo = collections.namedtuple("FileInfo", "path stem title season episode loose")
+PairMatch = collections.namedtuple("PairMatch", "video subtitle confidence reason")
+
+EPISODE_PATTERNS = (
+    re.compile(r"\bs(\d{1,2})[ ._-]?e(\d{1,4})\b", re.IGNORECASE), # S01E02, s1.e2
+    re.compile(r"\b(\d{1,2})x(\d{2,4})\b", re.IGNORECASE), # 1x02
+)
+EPISODE_ONLY_PATTERNS = (
+    re.compile(r"\b(?:e|ep|episode)[ ._-]?(\d{1,4})\b", re.IGNORECASE), # E02, Ep 02, Episode 2
+    re.compile(r"(?:^|\s)-\s*(\d{1,4})(?:v\d)?\s*(?:-|$)"), # Show - 02 - Title, Show - 02v2
+)
+LOOSE_NUMBER_PATTERN = re.compile(r"(?:^|\s)(\d{1,3})(?:\s|$)") # A bare number, used only as a last resort
+
+BRACKETED = re.compile(r"[\[\(\{][^\]\)\}]*[\]\)\}]")
+NOISE_TOKENS = re.compile(
+    r"\b(?:\d{3,4}p|[248]k|x26[45]|h\.?26[45]|hevc|avc|aac\d?(?:\.\d)?|ac3|dts|ddp?\d?(?:\.\d)?|10bit|8bit|"
+    r"web(?:-?dl|rip)?|blu-?ray|bdrip|brrip|hdtv|dvdrip|remux|proper|repack|hdr|sdr|amzn|nf|dsnp)\b",
+    re.IGNORECASE)
+SEPARATORS = re.compile(r"[._]+")
+# Trailing subtitle language tags, e.g. "Show.S01E02.fa.srt"
+LANGUAGE_SUFFIX = re.compile(r"[ ._-](?:fa|per|fas|persian|farsi|en|eng|english|fr|fre|fra|es|spa|pt|por|he|heb|forced|sdh)$",
+                             re.IGNORECASE)
+
+
+def normalize(text):
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+def parse_filename(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    while LANGUAGE_SUFFIX.search(name):
+        name = LANGUAGE_SUFFIX.sub("", name)
+    cleaned = SEPARATORS.sub(" ", NOISE_TOKENS.sub(" ", BRACKETED.sub(" ", name)))
+    stem = normalize(cleaned)
+
+    season = episode = None
+    loose = False
+    title_end = len(cleaned)
+    for pattern in EPISODE_PATTERNS:
+        match = pattern.search(cleaned)
+        if match:
+            season, episode = int(match.group(1)), int(match.group(2))
+            title_end = match.start()
+            break
+    else:
+        for pattern in EPISODE_ONLY_PATTERNS + (LOOSE_NUMBER_PATTERN,):
+            match = pattern.search(cleaned)
+            if match:
+                episode = int(match.group(1))
+                title_end = match.start()
+                loose = pattern is LOOSE_NUMBER_PATTERN
+                break
+    return FileInfo(path, stem, normalize(cleaned[:title_end]), season, episode, loose)
+
+
+def title_similarity(a, b):
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.5 # One side has no title to compare, e.g. "02.srt"
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def episode_confidence(video, subtitle):
+    if video.season is not None and subtitle.season is not None:
+        if video.season != subtitle.season:
+            return 0.0
+        base, weight = 0.8, 0.2
+    elif video.loose or subtitle.loose:
+        base, weight = 0.4, 0.3
+    else:
+        base, weight = 0.6, 0.3
+    return base + weight * title_similarity(video.title, subtitle.title)
+
+
+def match_files(video_files, subtitle_files, min_confidence=0.5):
+    # Returns (matches, unmatched_videos, unmatched_subtitles); matches are PairMatch tuples sorted by video path
+    videos = [parse_filename(path) for path in video_files]
+    subtitles = [parse_filename(path) for path in subtitle_files]
+
+    by_stem = collections.defaultdict(list)
+    by_episode = collections.defaultdict(list)
+    for index, subtitle in enumerate(subtitles):
+        by_stem[subtitle.stem].append(index)
+        if subtitle.episode is not None:
+            by_episode[(subtitle.season, subtitle.episode)].append(index)
+            if subtitle.season is not None:
+                by_episode[(None, subtitle.episode)].append(index) # Reachable from videos without a season
+
+    candidates = []
+    for video_index, video in enumerate(videos):
+        seen = set()
+        for subtitle_index in by_stem.get(video.stem, ()):
+            seen.add(subtitle_index)
+            candidates.append((1.0, video_index, subtitle_index, "name"))
+        if video.episode is None:
+            continue
+        keys = [(video.season, video.episode)]
+        if video.season is not None:
+            keys.append((None, video.episode))
+        for key in keys:
+            for subtitle_index in by_episode.get(key, ()):
+                if subtitle_index in seen:
+                    continue
+                seen.add(subtitle_index)
+                confidence = episode_confidence(video, subtitles[subtitle_index])
+                if confidence >= min_confidence:
+                    candidates.append((confidence, video_index, subtitle_index, "episode"))
+
+    # Greedy assignment, best candidates first; each file is used at most once
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1], candidate[2]))
+    used_videos, used_subtitles = set(), set()
+    matches = []
+    for confidence, video_index, subtitle_index, reason in candidates:
+        if video_index in used_videos or subtitle_index in used_subtitles:
+            continue
+        used_videos.add(video_index)
+        used_subtitles.add(subtitle_index)
+        matches.append(PairMatch(videos[video_index].path, subtitles[subtitle_index].path, round(confidence, 2), reason))
+
+    matches.sort(key=lambda match: match.video)
+    unmatched_videos = sorted(video.path for index, video in enumerate(videos) if index not in used_videos)
+    unmatched_subtitles = sorted(subtitle.path for index, subtitle in enumerate(subtitles) if index not in used_subtitles)
+    return matches, unmatched_videos, unmatched_subtitles
@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+try:
+    import resource # Not available on Windows; peak RSS is reported as null there
+except ImportError:
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import charset_detect
+from auto_pairing import match_files
+from dir_scan import scan_media_files
+from job_cache import JobCache
+from job_journal import JobJournal
+from embed_engine import VIDEO_EXTENSIONS, SUBTITLE_EXTENSIONS, BatchRunner
+
+# Benchmark for the non-GUI batch path (scan, pairing, charset detection, mkvmerge jobs,
+# cached re-run) and, when a display is available, the GUI list refresh cost.
+# Uses bench/fake_mkvmerge.py instead of a real mkvmerge. Results are printed as JSON;
+# pass --compare with an earlier result file to see the change per stage.
+#
+#   python bench/bench_embed.py --files 10000 --jobs 500 --output bench_output.json
+
+RESULT_SCHEMA = 1
+SUBTITLE_SAMPLES = (
+    "1\r\n00:00:01,000 --> 00:00:02,000\r\nHello there\r\n\r\n".encode("utf-8"),
+    "1\n00:00:01,000 --> 00:00:02,000\nمرحبا بالعالم\n\n".encode("cp1256"),
+    "1\n00:00:01,000 --> 00:00:02,000\nشب بخیر\n\n".encode("utf-8-sig"),
+    "1\n00:00:01,000 --> 00:00:02,000\nCafé crème\n\n".encode("cp1252"),
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the subtitle embed pipeline with a fake mkvmerge.")
+    parser.add_argument("--files", type=int, default=1000, help="Number of video/subtitle pairs to generate")
+    parser.add_argument("--jobs", type=int, default=200, help="How many of the pairs to run through mkvmerge")
+    parser.add_argument("--workers", type=int, default=0, help="Parallel jobs (0 = engine default)")
+    parser.add_argument("--per-device-jobs", type=int, default=0, help="Jobs per disk at once (0 = engine default)")
+    parser.add_argument("--scratch", action="store_true", help="Stage outputs in a scratch folder inside the work directory")
+    parser.add_argument("--job-seconds", type=float, default=0.05, help="Simulated mkvmerge run time per job")
+    parser.add_argument("--video-bytes", type=int, default=4096, help="Size of each generated video file")
+    parser.add_argument("--output-bytes", type=int, default=0, help="Bytes written per output (0 = size of the inputs)")
+    parser.add_argument("--log-lines", type=int, default=10, help="Extra output lines printed per job")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of jobs that fail")
+    parser.add_argument("--no-ui", action="store_true", help="Skip the GUI refresh stage")
+    parser.add_argument("--output", help="Also write the JSON result to this file")
+    parser.add_argument("--compare", help="Earlier JSON result to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated work directory")
+    return parser.parse_args(argv)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # bytes on macOS, KiB elsewhere
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(stages, name, function, **details):
+    started = time.perf_counter()
+    result = function()
+    stages[name] = dict(seconds=round(time.perf_counter() - started, 4), peak_rss_mb=peak_rss_mb(), **details)
+    return result
+
+
+def make_fake_mkvmerge(work_dir):
+    # Popen needs an executable, so wrap the script for the current interpreter
+    script = os.path.join(REPO_DIR, "bench", "fake_mkvmerge.py")
+    if os.name == "nt":
+        launcher = os.path.join(work_dir, "mkvmerge.cmd")
+        with open(launcher, 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        launcher = os.path.join(work_dir, "mkvmerge")
+        with open(launcher, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(launcher, 0o755)
+    return launcher
+
+
+def generate_library(source_dir, count, video_bytes):
+    # A few shows spread over season folders, subtitles in a mix of encodings
+    video_data = b"\0" * video_bytes
+    for index in range(count):
+        show, season, episode = index % 7, index // 500 + 1, index % 500 + 1
+        folder = os.path.join(source_dir, f"Show {show}", f"Season {season:02d}")
+        os.makedirs(folder, exist_ok=True)
+        name = f"Show.{show}.S{season:02d}E{episode:03d}.1080p.WEB-DL"
+        with open(os.path.join(folder, name + ".mkv"), 'wb') as f:
+            f.write(video_data)
+        with open(os.path.join(folder, name + ".fa.srt"), 'wb') as f:
+            f.write(SUBTITLE_SAMPLES[index % len(SUBTITLE_SAMPLES)])
+
+
+def scan(source_dir):
+    videos, subtitles = [], []
+
+    def on_chunk(chunk_videos, chunk_subtitles):
+        videos.extend(chunk_videos)
+        subtitles.extend(chunk_subtitles)
+
+    scan_media_files(source_dir, VIDEO_EXTENSIONS, SUBTITLE_EXTENSIONS, on_chunk)
+    return videos, subtitles
+
+
+def run_batch(args, work_dir, mkvmerge_path, pairs):
+    job_times, started_at, statuses = [], {}, {}
+
+    def on_event(event, pair_id, payload):
+        if event == 'running':
+            started_at[pair_id] = time.perf_counter()
+        elif event != 'progress':
+            statuses[pair_id] = event
+            if pair_id in started_at:
+                job_times.append(time.perf_counter() - started_at.pop(pair_id))
+
+    runner = BatchRunner(mkvmerge_path, os.path.join(work_dir, "output"), "per", args.workers, on_event=on_event,
+                         job_cache=JobCache(os.path.join(work_dir, "job_cache.json")),
+                         journal=JobJournal(os.path.join(work_dir, "job_journal.jsonl")), per_device_jobs=args.per_device_jobs,
+                         scratch_folder=os.path.join(work_dir, "scratch") if args.scratch else None)
+    started = time.perf_counter()
+    runner.run(pairs)
+    elapsed = time.perf_counter() - started
+
+    counts = {}
+    for status in statuses.values():
+        counts[status] = counts.get(status, 0) + 1
+    quantiles = statistics.quantiles(job_times, n=20) if len(job_times) >= 2 else [0.0] * 19
+    return {
+        'jobs': len(pairs),
+        'workers': runner.max_workers,
+        'jobs_per_sec': round(len(pairs) / elapsed, 2) if elapsed else None,
+        'job_p50_seconds': round(quantiles[9], 4),
+        'job_p95_seconds': round(quantiles[18], 4),
+        'statuses': counts,
+        'cpu_seconds': runner.metrics.summary()['cpu_seconds'],
+    }
+
+
+def measure_ui(work_dir, videos, subtitles, pairs):
+    # Needs customtkinter and a display; reports the stage as skipped when either is missing
+    try:
+        import customtkinter as ctk
+        import gen3
+        root = ctk.CTk()
+    except Exception as e:
+        return {'skipped': str(e)}
+
+    previous_dir = os.getcwd()
+    os.chdir(work_dir) # The app reads and writes config.json in the working directory
+    try:
+        root.withdraw()
+        app = gen3.SubtitleEmbedderApp(root)
+        app.raw_video_files, app.raw_subtitle_files = sorted(videos), sorted(subtitles)
+        for pair_id, data in pairs.items():
+            app.paired_files[pair_id] = dict(data, status='pending')
+        app.paired_order = sorted(pairs)
+        root.update()
+
+        def repeat(function, times=20):
+            started = time.perf_counter()
+            for _ in range(times):
+                function()
+                root.update_idletasks()
+            return round((time.perf_counter() - started) / times * 1000, 3)
+
+        return {
+            'update_listbox_ms': repeat(lambda: app.update_listbox(app.video_listbox, app.raw_video_files)),
+            'display_paired_files_ms': repeat(app.display_paired_files),
+            'update_paired_row_ms': repeat(lambda: app.update_paired_row(app.paired_order[0]), 200),
+            'rows': len(pairs),
+        }
+    finally:
+        os.chdir(previous_dir)
+        root.destroy()
+
+
+def compare(result, baseline):
+    print(f"\nCompared with {baseline.get('git_commit')} ({baseline.get('timestamp')}):", file=sys.stderr)
+    for name, stage in result['stages'].items():
+        before = baseline.get('stages', {}).get(name, {}).get('seconds')
+        if before:
+            print(f"  {name:<10} {before:>9.3f}s -> {stage['seconds']:>9.3f}s ({(stage['seconds'] / before - 1) * 100:+.1f}%)", file=sys.stderr)
+    for key in ('jobs_per_sec',):
+        for batch in ('run', 'rerun'):
+            before = baseline.get(batch, {}).get(key)
+            now = result.get(batch, {}).get(key)
+            if before and now:
+                print(f"  {batch} {key}: {before} -> {now} ({(now / before - 1) * 100:+.1f}%)", file=sys.stderr)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    work_dir = tempfile.mkdtemp(prefix="subembed_bench_")
+    os.environ.update({
+        "FAKE_MKVMERGE_SECONDS": str(args.job_seconds),
+        "FAKE_MKVMERGE_OUTPUT_BYTES": str(args.output_bytes),
+        "FAKE_MKVMERGE_LOG_LINES": str(args.log_lines),
+        "FAKE_MKVMERGE_FAIL_RATE": str(args.fail_rate),
+    })
+    stages = {}
+    result = {
+        'schema': RESULT_SCHEMA,
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': vars(args),
+        'stages': stages,
+    }
+    try:
+        source_dir = os.path.join(work_dir, "source")
+        mkvmerge_path = make_fake_mkvmerge(work_dir)
+        timed(stages, 'generate', lambda: generate_library(source_dir, args.files, args.video_bytes), files=args.files * 2)
+        videos, subtitles = timed(stages, 'scan', lambda: scan(source_dir))
+        matches, unmatched_videos, unmatched_subtitles = timed(stages, 'pairing', lambda: match_files(videos, subtitles))
+        stages['pairing'].update(pairs=len(matches), unmatched=len(unmatched_videos) + len(unmatched_subtitles))
+        charset_detect.charset_cache.clear()
+        timed(stages, 'charset', lambda: charset_detect.detect_charsets(subtitles, "per"), files=len(subtitles))
+
+        pairs = {pair_id: {'video': match.video, 'subtitle': match.subtitle}
+                 for pair_id, match in enumerate(matches[:args.jobs], start=1)}
+        result['run'] = timed(stages, 'run', lambda: run_batch(args, work_dir, mkvmerge_path, pairs))
+        result['rerun'] = timed(stages, 'rerun', lambda: run_batch(args, work_dir, mkvmerge_path, pairs)) # All cached
+
+        if not args.no_ui:
+            all_pairs = {pair_id: {'video': match.video, 'subtitle': match.subtitle}
+                         for pair_id, match in enumerate(matches, start=1)}
+            result['ui'] = measure_ui(work_dir, videos, subtitles, all_pairs)
+        result['peak_rss_mb'] = peak_rss_mb()
+    finally:
+        if args.keep:
+            print(f"Work directory kept: {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
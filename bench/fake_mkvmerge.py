@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import time
+import random
+
+# Stand-in for mkvmerge used by bench_embed.py. Accepts the same command lines the
+# engine builds, prints progress the way mkvmerge does and writes an output file.
+# "-J <file>" prints an identification like mkvmerge's, recognizing files by extension,
+# and "--version" prints a version line.
+# Behaviour is set through environment variables so the engine needs no changes:
+#   FAKE_MKVMERGE_SECONDS       simulated run time per job (default 0.05)
+#   FAKE_MKVMERGE_OUTPUT_BYTES  bytes to write to -o; 0 means the size of the inputs (default 0)
+#   FAKE_MKVMERGE_LOG_LINES     extra non-progress lines to print per job (default 10)
+#   FAKE_MKVMERGE_FAIL_RATE     fraction of jobs that exit with code 2 (default 0)
+
+PROGRESS_STEPS = 10
+WRITE_CHUNK = 1024 * 1024
+TRACK_TYPES = {".mkv": ["video", "audio"], ".mp4": ["video", "audio"], ".avi": ["video", "audio"], ".webm": ["video", "audio"],
+               ".flv": ["video", "audio"], ".srt": ["subtitles"], ".ass": ["subtitles"], ".sub": ["subtitles"], ".idx": ["subtitles"]}
+
+
+def identify(path):
+    if not os.path.isfile(path):
+        print(json.dumps({"errors": [f"The file '{path}' could not be opened for reading."]}))
+        return 2
+    tracks = TRACK_TYPES.get(os.path.splitext(path)[1].lower())
+    recognized = bool(tracks) and os.path.getsize(path) > 0
+    print(json.dumps({
+        "container": {"recognized": recognized, "supported": recognized, "type": os.path.splitext(path)[1].lstrip(".").upper() if recognized else None},
+        "tracks": [{"id": index, "type": track_type} for index, track_type in enumerate(tracks or [])],
+        "errors": [] if recognized else ["The type of file could not be recognized."],
+    }))
+    return 0 if recognized else 2
+
+
+def main(argv):
+    seconds = float(os.environ.get("FAKE_MKVMERGE_SECONDS", "0.05"))
+    output_bytes = int(os.environ.get("FAKE_MKVMERGE_OUTPUT_BYTES", "0"))
+    log_lines = int(os.environ.get("FAKE_MKVMERGE_LOG_LINES", "10"))
+    fail_rate = float(os.environ.get("FAKE_MKVMERGE_FAIL_RATE", "0"))
+
+    if argv == ["--version"]:
+        print("mkvmerge v0.0.0 ('Fake') 64-bit")
+        return 0
+    if argv[:1] == ["-J"] and len(argv) == 2:
+        return identify(argv[1])
+    if "-o" not in argv:
+        print("Error: no output file given (-o)")
+        return 2
+    output_path = argv[argv.index("-o") + 1]
+    input_paths = [arg for arg in argv if not arg.startswith("-") and arg != output_path and os.path.isfile(arg)]
+    gui_mode = "--gui-mode" in argv
+
+    for step in range(PROGRESS_STEPS + 1):
+        percent = step * 100 // PROGRESS_STEPS
+        print(f"#GUI#progress {percent}%" if gui_mode else f"Progress: {percent}%", flush=True)
+        for line in range(log_lines // (PROGRESS_STEPS + 1)):
+            print(f"Fake mkvmerge: simulated output line {step}.{line}")
+        if step < PROGRESS_STEPS:
+            time.sleep(seconds / PROGRESS_STEPS)
+
+    if random.random() < fail_rate:
+        print("Error: simulated mkvmerge failure", flush=True)
+        return 2
+
+    remaining = output_bytes or sum(os.path.getsize(path) for path in input_paths)
+    chunk = b"\0" * min(WRITE_CHUNK, max(remaining, 1))
+    with open(output_path, 'wb') as f:
+        while remaining > 0:
+            f.write(chunk[:remaining])
+            remaining -= len(chunk)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,112 @@
+import os
+import codecs
+import threading
+import concurrent.futures
+
+# Picks the --sub-charset value for each text subtitle. Every file is read once;
+# results are cached per (path, size, mtime) for the lifetime of the process.
+
+# Legacy code pages to try, in order, for each subtitle language code (see LANGUAGE_MAP)
+CHARSET_CANDIDATES = {
+    "per": ("cp1256",),
+    "heb": ("cp1255", "ISO-8859-8"),
+    "eng": ("cp1252",),
+    "fre": ("cp1252", "ISO-8859-15"),
+    "spa": ("cp1252", "ISO-8859-15"),
+    "por": ("cp1252", "ISO-8859-15"),
+}
+FALLBACK_CHARSET = "ISO-8859-1" # Decodes any byte sequence, so detection always ends here at the latest
+
+# Image based subtitles (VobSub) have no character set
+NO_CHARSET_EXTENSIONS = (".idx",)
+SNIFF_BYTES = 4096
+
+BOMS = (
+    (codecs.BOM_UTF8, "UTF-8"),
+    (codecs.BOM_UTF16_LE, "UTF-16LE"),
+    (codecs.BOM_UTF16_BE, "UTF-16BE"),
+)
+
+charset_cache = {}
+charset_cache_lock = threading.Lock()
+
+
+def guess_utf16_without_bom(data):
+    # Mostly-ASCII UTF-16 text has a NUL in every other byte
+    sample = data[:4096]
+    if len(sample) < 4:
+        return None
+    odd_nuls = sample[1::2].count(0)
+    even_nuls = sample[0::2].count(0)
+    half = len(sample) // 2
+    if odd_nuls > half * 0.3 and even_nuls < half * 0.05:
+        return "UTF-16LE"
+    if even_nuls > half * 0.3 and odd_nuls < half * 0.05:
+        return "UTF-16BE"
+    return None
+
+
+def is_image_subtitle(path):
+    # A VobSub .idx, or the binary .sub next to it; a MicroDVD .sub is plain text
+    lower_path = path.lower()
+    if lower_path.endswith(NO_CHARSET_EXTENSIONS):
+        return True
+    if not lower_path.endswith(".sub"):
+        return False
+    try:
+        with open(path, 'rb') as f:
+            return b"\x00" in f.read(SNIFF_BYTES)
+    except OSError:
+        return False
+
+
+def detect_charset_from_bytes(data, lang_code=None):
+    for bom, charset in BOMS:
+        if data.startswith(bom):
+            return charset
+    utf16 = guess_utf16_without_bom(data)
+    if utf16:
+        return utf16
+    if b"\x00" in data:
+        return None # Binary, e.g. the .sub half of a VobSub pair
+    try:
+        data.decode("utf-8")
+        return "UTF-8"
+    except UnicodeDecodeError:
+        pass
+    for charset in CHARSET_CANDIDATES.get(lang_code, ()) + ("cp1252",):
+        try:
+            data.decode(charset)
+            return charset
+        except UnicodeDecodeError:
+            continue
+    return FALLBACK_CHARSET
+
+
+def detect_charset(path, lang_code=None):
+    # Returns the charset name for mkvmerge, or None if the file has no text encoding
+    if path.lower().endswith(NO_CHARSET_EXTENSIONS):
+        return None
+    st = os.stat(path)
+    cache_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, lang_code)
+    with charset_cache_lock:
+        if cache_key in charset_cache:
+            return charset_cache[cache_key]
+    with open(path, 'rb') as f:
+        charset = detect_charset_from_bytes(f.read(), lang_code)
+    with charset_cache_lock:
+        charset_cache[cache_key] = charset
+    return charset
+
+
+def detect_charsets(paths, lang_code=None, max_workers=None):
+    # Detects a whole batch concurrently; files that can't be read map to None
+    def detect_or_none(path):
+        try:
+            return detect_charset(path, lang_code)
+        except OSError:
+            return None
+
+    unique_paths = list(dict.fromkeys(paths))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(unique_paths, executor.map(detect_or_none, unique_paths)))
@@ -0,0 +1,47 @@
+import os
+
+# Recursive folder ingest. Walks with os.scandir (no extra stat calls on most platforms)
+# and hands results over in chunks so a caller on another thread can show them while
+# a large share is still being scanned.
+
+SCAN_CHUNK_SIZE = 500
+
+
+def walk_files(root):
+    # Iterative, so deep trees can't hit the recursion limit; directory symlinks are not
+    # followed, so link loops can't make the scan run forever. Unreadable folders are skipped.
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def scan_media_files(root, video_extensions, subtitle_extensions, on_chunk, chunk_size=SCAN_CHUNK_SIZE, cancel_event=None):
+    # Calls on_chunk(video_paths, subtitle_paths) every chunk_size matches and once more at the end
+    videos, subtitles = [], []
+    for path in walk_files(root):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        lower_path = path.lower()
+        if lower_path.endswith(video_extensions):
+            videos.append(path)
+        elif lower_path.endswith(subtitle_extensions):
+            subtitles.append(path)
+        else:
+            continue
+        if len(videos) + len(subtitles) >= chunk_size:
+            on_chunk(videos, subtitles)
+            videos, subtitles = [], []
+    if videos or subtitles:
+        on_chunk(videos, subtitles)
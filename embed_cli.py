@@ -0,0 +1,258 @@
+import os
+import sys
+import signal
+import argparse
+
+from auto_pairing import match_files
+from job_cache import HASH_MODES, job_cache_from_config
+from job_journal import JobJournal, journal_path_for
+from preflight import CONFLICT_MODES, preflight_from_config
+from subtitle_prep import subtitle_prep_from_config
+from embed_engine import (LANGUAGE_MAP, VIDEO_EXTENSIONS, SUBTITLE_EXTENSIONS, DEFAULT_CONFIG_FILE, BatchRunner,
+                          load_config, collect_files, pair_by_sorted_names, resolve_language_code)
+
+# Headless entry point: python embed_cli.py -v <videos> -s <subtitles> -o <output folder>
+#                   or: python embed_cli.py --resume
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Embed subtitle files into videos with mkvmerge, without the GUI.")
+    parser.add_argument("-v", "--videos", nargs="+",
+                        help="Video files, folders or manifest files (.txt/.lst, one path per line)")
+    parser.add_argument("-s", "--subtitles", nargs="+",
+                        help="Subtitle files, folders or manifest files (.txt/.lst, one path per line)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Also look for files in subfolders of the given folders")
+    parser.add_argument("-o", "--output", help="Output folder")
+    parser.add_argument("-l", "--language", default="Persian",
+                        help=f"Subtitle language name ({', '.join(LANGUAGE_MAP)}) or ISO 639-2 code")
+    parser.add_argument("-a", "--add-subtitles", nargs="+", action="append", default=[], metavar=("LANGUAGE", "PATH"),
+                        help="Extra subtitle track in another language, muxed in the same mkvmerge run; "
+                             "e.g. -a English subs/en -a French subs/fr (paired to the videos like -s)")
+    parser.add_argument("--default-language", default=None,
+                        help="Language whose subtitle track is marked default (default: the -l/--language track)")
+    parser.add_argument("--sub-charset", default=None,
+                        help="Subtitle character set passed to mkvmerge, or 'auto' to detect it per file (default: from config, else auto)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Parallel mkvmerge jobs (default: from config, else auto)")
+    parser.add_argument("--per-device-jobs", type=int, default=None,
+                        help="Jobs allowed to use one disk at the same time (default: from config, else auto by disk type)")
+    parser.add_argument("--scratch", default=None,
+                        help="Fast local folder mkvmerge writes to before finished files are moved to the output folder (default: from config)")
+    parser.add_argument("--mkvmerge", default=None, help="Path to mkvmerge (default: from config, else PATH)")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FILE, help="Settings file shared with the GUI")
+    parser.add_argument("--no-cache", action="store_true", help="Remux every pair even if an earlier output is still valid")
+    parser.add_argument("--cache-hash", choices=HASH_MODES, default=None,
+                        help="How to verify inputs whose mtime changed (default: from config, else partial)")
+    parser.add_argument("--no-preflight", action="store_true",
+                        help="Start remuxing without first checking inputs, output names and free disk space")
+    parser.add_argument("--on-conflict", choices=CONFLICT_MODES, default=None,
+                        help="What to do when two outputs would get the same name (default: from config, else rename)")
+    parser.add_argument("--prep", action="store_true",
+                        help="Re-encode text subtitles to UTF-8 without BOM and normalize line endings before muxing (default: from config)")
+    parser.add_argument("--shift-ms", type=int, default=None,
+                        help="Shift all .srt/.ass subtitle timings by this many milliseconds, may be negative (implies --prep)")
+    parser.add_argument("--to-ass", action="store_true", help="Convert .srt subtitles to .ass with the house style (implies --prep)")
+    parser.add_argument("--pairing", choices=("smart", "sorted"), default="smart",
+                        help="smart: match season/episode numbers and names; sorted: pair the n-th video with the n-th subtitle")
+    parser.add_argument("--metrics", default=None,
+                        help="Write per-job timings, sizes and exit codes plus batch totals to this file (.csv for CSV, otherwise JSON)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the pairs without running mkvmerge")
+    parser.add_argument("--resume", action="store_true",
+                        help="Re-run the unfinished jobs of the last interrupted batch (from the GUI or the CLI) instead of pairing new files")
+    args = parser.parse_args(argv)
+    if any(len(extra) < 2 for extra in args.add_subtitles):
+        parser.error("-a/--add-subtitles needs a language followed by at least one path")
+    if not args.resume and not (args.videos and args.subtitles and args.output):
+        parser.error("-v/--videos, -s/--subtitles and -o/--output are required unless --resume is given")
+    return args
+
+
+def log_event(event, pair_id, payload, pairs):
+    if event == 'preflight':
+        for renamed_pair_id, output_path in sorted(payload.renamed.items()):
+            print(f"[{renamed_pair_id}] Output name already used, writing {os.path.basename(output_path)} instead", flush=True)
+        for message in payload.errors:
+            print(f"Pre-flight check failed: {message}", file=sys.stderr, flush=True)
+        return
+    if event == 'warning':
+        print(f"Warning: {payload}", file=sys.stderr, flush=True)
+        return
+    if event == 'subtitles_prepared':
+        print(f"Subtitles prepared: {payload.processed} processed, {payload.reused} unchanged and reused from the cache, "
+              f"{len(payload.failed)} failed", flush=True)
+        return
+    name = os.path.basename(pairs[pair_id]['video'])
+    if event == 'rejected':
+        print(f"[{pair_id}] Not processed, pre-flight check failed: {'; '.join(payload)}", file=sys.stderr, flush=True)
+    elif event == 'running':
+        charsets = ", ".join(charset or 'n/a' for charset in payload['charsets'])
+        print(f"[{pair_id}] Processing {name} (subtitle charset: {charsets})", flush=True)
+    elif event == 'progress':
+        if payload['percent'] % 10 == 0:
+            print(f"[{pair_id}] {payload['percent']}% ({payload['mb_per_s']:.1f} MB/s)", flush=True)
+    elif event == 'cached':
+        print(f"[{pair_id}] Unchanged, skipped: {name}", flush=True)
+    elif event == 'success':
+        print(f"[{pair_id}] Done: {name} in {payload['elapsed']:.1f}s ({payload['mb_per_s']:.1f} MB/s)", flush=True)
+    elif event == 'failed':
+        print(f"[{pair_id}] mkvmerge failed for {name} (exit code {payload.returncode}): {payload.stderr.strip() or payload.stdout.strip()}", file=sys.stderr, flush=True)
+    elif event == 'mkvmerge_missing':
+        print(f"[{pair_id}] mkvmerge not found: {payload}", file=sys.stderr, flush=True)
+    elif event == 'cancelled':
+        print(f"[{pair_id}] Cancelled: {name}", flush=True)
+    elif event == 'error':
+        print(f"[{pair_id}] Unknown error for {name}: {payload}", file=sys.stderr, flush=True)
+
+
+def cancel_on_interrupt(runner):
+    # The first Ctrl+C stops mkvmerge and removes partial outputs; a second one quits right away
+    def handler(signum, frame):
+        print("Cancelling, press Ctrl+C again to quit immediately...", file=sys.stderr, flush=True)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        runner.cancel()
+    signal.signal(signal.SIGINT, handler)
+
+
+def build_pairs(args):
+    # Returns a dict of pair_id -> {'video', 'subtitle'}, or None after printing an error
+    try:
+        video_files = collect_files(args.videos, VIDEO_EXTENSIONS, args.recursive)
+        subtitle_files = collect_files(args.subtitles, SUBTITLE_EXTENSIONS, args.recursive)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return None
+    if not video_files or not subtitle_files:
+        print("Error: video and/or subtitle lists are empty.", file=sys.stderr)
+        return None
+    if args.pairing == "sorted":
+        if len(video_files) != len(subtitle_files):
+            print(f"Warning: {len(video_files)} videos but {len(subtitle_files)} subtitles; extra files are ignored.", file=sys.stderr)
+        matched = [(video_file, subtitle_file, "") for video_file, subtitle_file in pair_by_sorted_names(video_files, subtitle_files)]
+    else:
+        matches, unmatched_videos, unmatched_subtitles = match_files(video_files, subtitle_files)
+        matched = [(match.video, match.subtitle, f" (confidence {match.confidence:.2f}, by {match.reason})") for match in matches]
+        for path in unmatched_videos:
+            print(f"Unmatched video: {path}", file=sys.stderr)
+        for path in unmatched_subtitles:
+            print(f"Unmatched subtitle: {path}", file=sys.stderr)
+
+    pairs = {}
+    for pair_id, (video_file, subtitle_file, note) in enumerate(matched, start=1):
+        pairs[pair_id] = {'video': video_file, 'subtitle': subtitle_file}
+        print(f"Paired ID {pair_id}: '{os.path.basename(video_file)}' with '{os.path.basename(subtitle_file)}'{note}")
+    if not pairs:
+        print("Error: no pairs could be matched.", file=sys.stderr)
+        return None
+    if not add_extra_subtitles(args, pairs):
+        return None
+    return pairs
+
+
+def add_extra_subtitles(args, pairs):
+    # Pairs each -a/--add-subtitles set with the already paired videos and adds it as an extra track
+    pair_id_by_video = {data['video']: pair_id for pair_id, data in pairs.items()}
+    default_language = resolve_language_code(args.default_language) if args.default_language else None
+    for language, *sources in args.add_subtitles:
+        lang_code = resolve_language_code(language)
+        try:
+            subtitle_files = collect_files(sources, SUBTITLE_EXTENSIONS, args.recursive)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return False
+        if args.pairing == "sorted":
+            matched = pair_by_sorted_names(pair_id_by_video, subtitle_files)
+            unmatched_subtitles = sorted(subtitle_files)[len(matched):]
+        else:
+            matches, _, unmatched_subtitles = match_files(list(pair_id_by_video), subtitle_files)
+            matched = [(match.video, match.subtitle) for match in matches]
+        for path in unmatched_subtitles:
+            print(f"Unmatched {lang_code} subtitle: {path}", file=sys.stderr)
+        for video_file, subtitle_file in matched:
+            pair_id = pair_id_by_video[video_file]
+            pairs[pair_id].setdefault('extra_subtitles', []).append(
+                {'path': subtitle_file, 'language': lang_code, 'default': lang_code == default_language})
+            print(f"Pair ID {pair_id}: added {lang_code} track '{os.path.basename(subtitle_file)}'")
+    return True
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = load_config(args.config)
+    mkvmerge_path = args.mkvmerge or config.get("mkvmerge_path", "mkvmerge")
+    max_workers = args.jobs if args.jobs is not None else int(config.get("max_workers", 0) or 0)
+    journal = JobJournal(journal_path_for(args.config))
+
+    if args.resume:
+        batches = journal.unfinished_batches()
+        if not batches:
+            print("Nothing to resume.")
+            return 0
+        batch = batches[-1]
+        pairs = batch['pairs']
+        output_folder, lang_code, sub_charset = batch['output_folder'], batch['lang_code'], batch['sub_charset']
+        print(f"Resuming {len(pairs)} of {batch['total']} jobs from the interrupted batch, output folder {output_folder}.")
+        for pair_id in sorted(pairs):
+            extra_count = len(pairs[pair_id].get('extra_subtitles', []))
+            extra_note = f" and {extra_count} more subtitle track(s)" if extra_count else ""
+            print(f"Pair ID {pair_id}: '{os.path.basename(pairs[pair_id]['video'])}' with '{os.path.basename(pairs[pair_id]['subtitle'])}'{extra_note}")
+    else:
+        pairs = build_pairs(args)
+        if pairs is None:
+            return 2
+        output_folder, lang_code = args.output, resolve_language_code(args.language)
+        sub_charset = args.sub_charset or config.get("sub_charset", "auto")
+    if args.dry_run:
+        return 0
+
+    if args.no_cache:
+        config["job_cache_enabled"] = False
+    if args.cache_hash:
+        config["job_cache_hash"] = args.cache_hash
+    if args.no_preflight:
+        config["preflight_enabled"] = False
+    if args.on_conflict:
+        config["output_conflicts"] = args.on_conflict
+    if args.prep:
+        config["subtitle_prep_enabled"] = True
+    if args.shift_ms is not None:
+        config["subtitle_shift_ms"] = args.shift_ms
+    if args.to_ass:
+        config["subtitle_to_ass"] = True
+
+    try:
+        journal.compact()
+    except OSError as e: # The batch still runs, it just can't be resumed if the journal can't be written either
+        print(f"Warning: could not compact the job journal: {e}", file=sys.stderr)
+    per_device_jobs = args.per_device_jobs if args.per_device_jobs is not None else int(config.get("per_device_jobs", 0) or 0)
+    scratch_folder = args.scratch or config.get("scratch_folder") or None
+    runner = BatchRunner(mkvmerge_path, output_folder, lang_code, max_workers,
+                         on_event=lambda event, pair_id, payload: log_event(event, pair_id, payload, pairs),
+                         job_cache=job_cache_from_config(config, args.config),
+                         sub_charset=sub_charset, journal=journal, preflight=preflight_from_config(config, args.config),
+                         per_device_jobs=per_device_jobs, scratch_folder=scratch_folder,
+                         subtitle_prep=subtitle_prep_from_config(config, args.config))
+    print(f"Running {len(pairs)} jobs with {runner.max_workers} parallel mkvmerge worker(s), language {lang_code}.")
+    cancel_on_interrupt(runner)
+    # A resumed batch is closed once the run below has journaled the same pairs as a new batch
+    results = runner.run(pairs, replaces_batch_id=batch['batch_id'] if args.resume else None)
+
+    processed_count = sum(1 for status in results.values() if status == 'success')
+    cached_count = sum(1 for status in results.values() if status == 'cached')
+    rejected_count = sum(1 for status in results.values() if status == 'rejected')
+    rejected_note = f", {rejected_count} rejected by the pre-flight check" if rejected_count else ""
+    print(f"{processed_count} of {len(pairs)} files processed successfully, {cached_count} unchanged and skipped{rejected_note}.")
+    for line in runner.metrics.summary_lines():
+        print(line)
+    if args.metrics:
+        try:
+            runner.metrics.export(args.metrics)
+            print(f"Run report written to {args.metrics}")
+        except OSError as e:
+            print(f"Could not write run report: {e}", file=sys.stderr)
+    if runner.cancel_event.is_set():
+        print("Cancelled. Run again with --resume to finish the remaining jobs.", file=sys.stderr)
+        return 130
+    return 0 if processed_count + cached_count == len(pairs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
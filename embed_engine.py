@@ -0,0 +1,559 @@
+import os
+import re
+import json
+import time
+import shutil
+import signal
+import threading
+import collections
+import subprocess
+import concurrent.futures
+
+from charset_detect import detect_charsets, is_image_subtitle
+from dir_scan import walk_files
+from io_scheduler import DeviceScheduler, is_rotational_disk
+from job_journal import JOURNALED_EVENTS
+from job_metrics import JobMetrics, error_summary
+from subtitle_prep import OUTPUT_CHARSET
+
+# Tk-free batch engine shared by the GUI (gen3.py) and the command line (embed_cli.py).
+# Nothing in here may import tkinter or customtkinter.
+
+LANGUAGE_MAP = {
+    "Persian": "per",
+    "English": "eng",
+    "French": "fre",
+    "Spanish": "spa",
+    "Portuguese": "por",
+    "Hebrew": "heb"
+}
+
+# Same filters as the file dialogs in the GUI
+VIDEO_EXTENSIONS = (".mkv", ".mp4", ".avi", ".webm", ".flv")
+SUBTITLE_EXTENSIONS = (".ass", ".srt", ".sub", ".idx")
+
+DEFAULT_CONFIG_FILE = "config.json"
+MANIFEST_EXTENSIONS = (".txt", ".lst") # Lists of paths; any other file named explicitly is used as-is
+
+# mkvmerge --gui-mode prints "#GUI#progress 42%", plain mode prints "Progress: 42%"
+PROGRESS_PATTERN = re.compile(r"(?:#GUI#progress|Progress:)\s*(\d+)%")
+OUTPUT_TAIL_LINES = 50 # mkvmerge output kept per job for error reports; the rest is discarded as it streams
+DISPATCH_POLL_SECONDS = 0.2 # How quickly the job loop notices pause, resume and cancel
+CANCEL_GRACE_SECONDS = 5 # mkvmerge processes still running this long after a cancel are killed
+VERSION_TIMEOUT_SECONDS = 15
+
+
+def load_config(config_file=DEFAULT_CONFIG_FILE):
+    try:
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+        return config if isinstance(config, dict) else {}
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_config(config, config_file=DEFAULT_CONFIG_FILE):
+    with open(config_file, 'w') as f:
+        json.dump(config, f, indent=4)
+
+
+def path_next_to_config(config_file, file_name):
+    # Caches, the journal and the log file live next to config.json, so each config gets its own
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), file_name)
+
+
+def default_worker_count(path=None):
+    cores = os.cpu_count() or 1
+    if path and is_rotational_disk(path):
+        return min(2, cores) # More parallel jobs only make a spinning disk seek
+    return max(1, min(cores // 2, 4))
+
+
+def resolve_language_code(language):
+    # Accepts either a display name from LANGUAGE_MAP or an ISO 639-2 code
+    if language in LANGUAGE_MAP:
+        return LANGUAGE_MAP[language]
+    for name, code in LANGUAGE_MAP.items():
+        if language.lower() in (name.lower(), code):
+            return code
+    return language
+
+
+def has_extension(path, extensions):
+    return path.lower().endswith(extensions)
+
+
+def read_manifest(manifest_path):
+    # One path per line; blank lines and '#' comments are ignored, relative paths are relative to the manifest
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    paths = []
+    try:
+        with open(manifest_path, 'r', encoding='utf-8-sig') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    except UnicodeDecodeError:
+        raise ValueError(f"{manifest_path} is not a UTF-8 text file with one path per line")
+    return paths
+
+
+def collect_files(sources, extensions, recursive=False):
+    # Expands directories and manifests into a sorted, de-duplicated file list
+    found = set()
+    for source in sources:
+        if os.path.isdir(source) and recursive:
+            found.update(path for path in walk_files(source) if has_extension(path, extensions))
+        elif os.path.isdir(source):
+            with os.scandir(source) as entries:
+                for entry in entries:
+                    if entry.is_file() and has_extension(entry.name, extensions):
+                        found.add(entry.path)
+        elif not os.path.isfile(source):
+            raise FileNotFoundError(f"No such file or directory: {source}")
+        elif has_extension(source, extensions):
+            found.add(source)
+        elif has_extension(source, MANIFEST_EXTENSIONS):
+            found.update(path for path in read_manifest(source) if has_extension(path, extensions))
+        else:
+            found.add(source) # Named explicitly, e.g. a .m2ts video, so the extension filter doesn't apply
+    return sorted(found)
+
+
+def pair_by_sorted_names(video_files, subtitle_files):
+    # Pairs the n-th video with the n-th subtitle after sorting both lists
+    return list(zip(sorted(video_files), sorted(subtitle_files)))
+
+
+def subtitle_tracks(data, lang_code):
+    # A pair's main 'subtitle' in the batch language, followed by its optional 'extra_subtitles'
+    # ({'path', 'language', 'charset', 'default'}); the main track is the default unless an extra one claims it
+    extras = data.get('extra_subtitles') or []
+    tracks = [{'path': data['subtitle'], 'language': lang_code, 'charset': None,
+               'default': not any(track.get('default') for track in extras)}]
+    for track in extras:
+        tracks.append({'path': track['path'], 'language': track.get('language') or lang_code,
+                       'charset': track.get('charset'), 'default': bool(track.get('default'))})
+    return tracks
+
+
+def mkvmerge_version(mkvmerge_path):
+    # First line of "mkvmerge --version", e.g. "mkvmerge v80.0 ('Roundabout') 64-bit", or None if it can't be run
+    try:
+        completed = subprocess.run([mkvmerge_path, "--version"], capture_output=True, text=True,
+                                   encoding='utf-8', errors='replace', timeout=VERSION_TIMEOUT_SECONDS)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    lines = completed.stdout.strip().splitlines()
+    return lines[0] if completed.returncode == 0 and lines else None
+
+
+def build_mkvmerge_command(mkvmerge_path, video_file_path, subtitle_tracks, output_file_path):
+    # All subtitle tracks go into one mkvmerge run, so the video is read and written only once
+    command = [
+        mkvmerge_path,
+        "--gui-mode",
+        "-o", output_file_path,
+        "-S",
+        video_file_path
+    ]
+    for track in subtitle_tracks:
+        command += ["--language", f"0:{track['language']}", "--default-track", f"0:{'yes' if track['default'] else 'no'}"]
+        if track['charset']: # None where BatchRunner.subtitle_charsets found no text encoding
+            command += ["--sub-charset", f"0:{track['charset']}"]
+        command.append(track['path'])
+    return command
+
+
+def partial_path_for(output_file_path):
+    # mkvmerge writes here first; the file is renamed to output_file_path only on success.
+    # The extension is kept because mkvmerge switches to WebM mode for .webm outputs.
+    stem, ext = os.path.splitext(output_file_path)
+    return f"{stem}.partial{ext}"
+
+
+def with_output_path(command, output_file_path):
+    # Same mkvmerge command, writing somewhere else
+    command = list(command)
+    command[command.index("-o") + 1] = output_file_path
+    return command
+
+
+def remove_if_exists(*paths):
+    for path in paths:
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def job_progress(percent, input_bytes, elapsed):
+    # Throughput is estimated from how much of the inputs mkvmerge says it has consumed
+    mb_per_s = (input_bytes * percent / 100) / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+    return {'percent': percent, 'elapsed': elapsed, 'mb_per_s': mb_per_s}
+
+
+def wait_for_exit(process):
+    # Returns (exit code, CPU seconds used by the process); the CPU time is None where os.wait4 doesn't exist (Windows)
+    if hasattr(os, "wait4"):
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            pass # Already reaped by Popen.poll(), which pause() and cancel() go through when signalling
+        else:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return process.returncode, usage.ru_utime + usage.ru_stime
+    return process.wait(), None
+
+
+class BatchRunner:
+    # Runs mkvmerge jobs on a thread pool and reports (event, pair_id, payload) tuples to on_event.
+    # Events: 'running' ({'charsets': [one per subtitle track]}), 'progress' (dict from job_progress), 'success' (same dict at 100%),
+    # 'cached' (output from an earlier run is still valid), 'failed' (CalledProcessError),
+    # 'mkvmerge_missing', 'skipped', 'error', 'cancelled'. With a preflight checker, one 'preflight' event (pair_id None, payload
+    # a preflight.PreflightResult) comes first, then 'rejected' (list of problems) for each pair that won't run.
+    # With subtitle preprocessing, one 'subtitles_prepared' event (pair_id None, a subtitle_prep.PrepResult) follows,
+    # and pairs whose subtitles couldn't be prepared get 'error' with the reason.
+    # on_event is called from worker threads, so GUI callers must hand it off to the Tk thread themselves.
+    # Each run() also fills in self.metrics (a job_metrics.JobMetrics) with per-job timings and sizes.
+    # pause(), resume() and cancel() may be called from any thread while run() is blocking in another.
+
+    def __init__(self, mkvmerge_path, output_folder, lang_code, max_workers=0, on_event=None, job_cache=None,
+                 sub_charset="auto", journal=None, preflight=None, per_device_jobs=0, scratch_folder=None, subtitle_prep=None):
+        self.mkvmerge_path = mkvmerge_path
+        self.output_folder = output_folder
+        self.lang_code = lang_code
+        self.sub_charset = sub_charset # "auto" detects each subtitle's encoding, anything else is passed as-is
+        # Optional fast local folder mkvmerge writes to; finished files are then moved to output_folder in one sequential copy
+        self.scratch_folder = scratch_folder or None
+        self.max_workers = max_workers or default_worker_count(self.scratch_folder or output_folder)
+        self.per_device_jobs = per_device_jobs # Jobs allowed per disk at once; 0 picks a limit from each disk's type
+        self.move_slots = None
+        self.on_event = on_event or (lambda event, pair_id, payload: None)
+        self.abort_event = threading.Event()
+        self.cancel_event = threading.Event() # Once set, stays set: a cancelled runner doesn't start new jobs
+        self.resume_event = threading.Event() # Cleared while paused
+        self.resume_event.set()
+        self.processes = {} # pair_id -> running mkvmerge Popen
+        self.process_lock = threading.Lock()
+        self.job_cache = job_cache # Optional job_cache.JobCache; pairs it reports as fresh are not remuxed
+        self.journal = journal # Optional job_journal.JobJournal recording the batch for crash-safe resume
+        self.preflight = preflight # Optional preflight.Preflight checking every pair before the first job starts
+        self.subtitle_prep = subtitle_prep # Optional subtitle_prep.SubtitlePrep; text subtitles are muxed from its UTF-8 copies
+        self.batch_id = None
+        self.metrics = JobMetrics()
+        self.queued_at = None # When the batch's jobs were handed to the scheduler, for each job's queue wait
+
+    def output_path_for(self, data):
+        # A pair carries its own 'output' when the pre-flight check renamed it to avoid a collision
+        return data.get('output') or os.path.join(self.output_folder, os.path.basename(data['video']))
+
+    def run(self, pairs, replaces_batch_id=None):
+        # pairs: dict of pair_id -> {'video': ..., 'subtitle': ..., optional 'extra_subtitles' and 'output'};
+        # blocks until every job has finished. replaces_batch_id is an interrupted journal batch these pairs resume;
+        # it is closed only once this batch has been journaled, so it stays resumable if nothing gets started.
+        os.makedirs(self.output_folder, exist_ok=True)
+        if self.scratch_folder:
+            os.makedirs(self.scratch_folder, exist_ok=True)
+        self.abort_event.clear()
+        self.batch_id = None
+        self.metrics = JobMetrics()
+        for pair_id in sorted(pairs):
+            self.metrics.add_job(pair_id, pairs[pair_id]['video'], [track['path'] for track in subtitle_tracks(pairs[pair_id], self.lang_code)],
+                                 self.output_path_for(pairs[pair_id]))
+        results = {}
+        requested_pairs = pairs
+        if self.preflight:
+            pairs = self.run_preflight(pairs, results)
+            if not pairs:
+                return results
+        tracks = {pair_id: subtitle_tracks(data, self.lang_code) for pair_id, data in pairs.items()}
+        self.subtitle_charsets([track for pair_tracks in tracks.values() for track in pair_tracks])
+        if self.subtitle_prep:
+            pairs = self.run_subtitle_prep(pairs, tracks, results)
+            if not pairs:
+                return results
+        if self.journal:
+            try:
+                # Rejected pairs are journaled too, without a status, so an interrupted batch still offers them for resume
+                self.batch_id = self.journal.start_batch({**requested_pairs, **pairs}, self.output_folder, self.lang_code, self.sub_charset)
+            except OSError:
+                self.batch_id = None # e.g. a read-only folder next to config.json; the batch runs, it just can't be resumed
+            if self.batch_id and replaces_batch_id:
+                try:
+                    self.journal.close_batch(replaces_batch_id)
+                except OSError:
+                    pass
+        # Jobs are started by the scheduler as their source and destination disks have room, not in pair order
+        scheduler = DeviceScheduler(self.max_workers, self.per_device_jobs)
+        write_folder = self.scratch_folder or self.output_folder
+        for pair_id in sorted(pairs):
+            data = pairs[pair_id]
+            output_path = self.output_path_for(data)
+            command = build_mkvmerge_command(self.mkvmerge_path, data['video'], tracks[pair_id], partial_path_for(output_path))
+            input_files = (data['video'],) + tuple(track['path'] for track in tracks[pair_id])
+            track_charsets = [track['charset'] for track in tracks[pair_id]]
+            scheduler.add((pair_id, command, input_files, output_path, track_charsets), data['video'], write_folder)
+        # Moves out of the scratch folder are sequential writes, limited like any other job on the output disk
+        output_device = scheduler.device_for(self.output_folder)
+        self.move_slots = threading.Semaphore(scheduler.limits.get(output_device, self.max_workers))
+        self.queued_at = time.monotonic()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                running = {}
+                while scheduler or running:
+                    if self.cancel_event.is_set():
+                        for job, devices in scheduler.drain():
+                            results[job[0]] = self.emit('cancelled', job[0], None)
+                    elif self.resume_event.is_set(): # While paused, running jobs finish but no new ones start
+                        while len(running) < self.max_workers:
+                            scheduled = scheduler.next_job()
+                            if scheduled is None:
+                                break
+                            job, devices = scheduled
+                            running[executor.submit(self.run_job, *job)] = (job[0], devices)
+                    if not running:
+                        self.resume_event.wait(DISPATCH_POLL_SECONDS)
+                        continue
+                    done, _ = concurrent.futures.wait(running, timeout=DISPATCH_POLL_SECONDS,
+                                                      return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        pair_id, devices = running.pop(future)
+                        scheduler.release(devices)
+                        results[pair_id] = future.result()
+            # Not in the finally block: a batch that didn't reach this point (crash or cancel) must stay resumable
+            if self.journal and self.batch_id and not self.cancel_event.is_set():
+                try:
+                    self.journal.close_batch(self.batch_id)
+                except OSError:
+                    pass
+        finally:
+            if self.job_cache:
+                try:
+                    self.job_cache.save()
+                except OSError as e: # Every output is already written; only the next run's skip check loses out
+                    self.emit('warning', None, f"Could not save the job cache: {e}")
+        return results
+
+    def pause(self):
+        # Stops new jobs from starting; running mkvmerge processes are suspended where the OS allows it (not on Windows)
+        with self.process_lock:
+            self.resume_event.clear()
+            for process in self.processes.values():
+                self.signal_process(process, getattr(signal, "SIGSTOP", None))
+
+    def resume(self):
+        with self.process_lock:
+            for process in self.processes.values():
+                self.signal_process(process, getattr(signal, "SIGCONT", None))
+            self.resume_event.set()
+
+    def cancel(self):
+        # Queued jobs are dropped, running mkvmerge processes terminated and their partial outputs removed
+        with self.process_lock:
+            self.cancel_event.set()
+            processes = list(self.processes.values())
+        self.resume() # Stopped processes can't act on SIGTERM
+        for process in processes:
+            try:
+                process.terminate()
+            except OSError:
+                pass
+        killer = threading.Timer(CANCEL_GRACE_SECONDS, self.kill_processes)
+        killer.daemon = True
+        killer.start()
+
+    def kill_processes(self):
+        with self.process_lock:
+            processes = list(self.processes.values())
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def signal_process(self, process, signal_number):
+        if signal_number is not None:
+            try:
+                process.send_signal(signal_number)
+            except OSError:
+                pass # Already exited
+
+    def is_paused(self):
+        return not self.resume_event.is_set()
+
+    def run_preflight(self, pairs, results):
+        # Returns the pairs that may run; rejected pairs are reported right away and left out of the batch
+        inputs = {pair_id: (data['video'],) + tuple(track['path'] for track in subtitle_tracks(data, self.lang_code))
+                  for pair_id, data in pairs.items()}
+        outputs = {pair_id: self.output_path_for(data) for pair_id, data in pairs.items()}
+        result = self.preflight.check(inputs, outputs, self.output_folder, self.mkvmerge_path, self.scratch_folder, self.max_workers)
+        self.emit('preflight', None, result)
+        for pair_id in sorted(result.problems):
+            self.metrics.update(pair_id, error_summary="; ".join(result.problems[pair_id]))
+            results[pair_id] = self.emit('rejected', pair_id, result.problems[pair_id])
+        for pair_id, output_path in result.renamed.items():
+            self.metrics.update(pair_id, output=output_path)
+        accepted = {pair_id: dict(data, output=result.renamed[pair_id]) if pair_id in result.renamed else data
+                    for pair_id, data in pairs.items() if pair_id not in result.problems}
+        if result.errors: # e.g. not enough disk space; nothing runs
+            for pair_id in sorted(accepted):
+                results[pair_id] = self.emit('skipped', pair_id, None)
+            return {}
+        return accepted
+
+    def run_subtitle_prep(self, pairs, tracks, results):
+        # Points each text subtitle track at its prepared UTF-8 copy; a pair with a subtitle that couldn't be prepared doesn't run
+        result = self.subtitle_prep.prepare([(track['path'], track['charset']) for pair_tracks in tracks.values() for track in pair_tracks])
+        self.emit('subtitles_prepared', None, result)
+        accepted = {}
+        for pair_id in sorted(pairs):
+            problems = [f"{os.path.basename(track['path'])}: {result.failed[(track['path'], track['charset'])]}"
+                        for track in tracks[pair_id] if (track['path'], track['charset']) in result.failed]
+            if problems:
+                self.metrics.update(pair_id, error_summary="; ".join(problems))
+                results[pair_id] = self.emit('error', pair_id, f"subtitle preprocessing failed: {'; '.join(problems)}")
+                continue
+            for track in tracks[pair_id]:
+                prepared_path = result.outputs.get((track['path'], track['charset']))
+                if prepared_path:
+                    track['path'], track['charset'] = prepared_path, OUTPUT_CHARSET
+            accepted[pair_id] = pairs[pair_id]
+        return accepted
+
+    def subtitle_charsets(self, tracks):
+        # Fills in each track's 'charset': a track's own charset wins, then a fixed sub_charset, else it's detected.
+        # Image subtitles never get a charset, mkvmerge rejects --sub-charset for them.
+        paths_by_language = collections.defaultdict(list)
+        for track in tracks:
+            if is_image_subtitle(track['path']):
+                track['charset'] = None
+            elif not track['charset'] and self.sub_charset != "auto":
+                track['charset'] = self.sub_charset
+            elif not track['charset']:
+                paths_by_language[track['language']].append(track['path'])
+        detected = {(path, language): charset for language, paths in paths_by_language.items()
+                    for path, charset in detect_charsets(paths, language).items()}
+        for track in tracks:
+            if (track['path'], track['language']) in detected and not track['charset']:
+                track['charset'] = detected[(track['path'], track['language'])]
+
+    def run_job(self, pair_id, command, input_files=(), output_path=None, charsets=()):
+        if self.cancel_event.is_set():
+            return self.emit('cancelled', pair_id, None)
+        if self.abort_event.is_set():
+            return self.emit('skipped', pair_id, None)
+        self.metrics.update(pair_id, queue_wait_seconds=round(time.monotonic() - self.queued_at, 3))
+        try:
+            cache_key = input_fingerprints = None
+            if self.job_cache and output_path:
+                cache_key = self.job_cache.job_key(command, input_files)
+                if self.job_cache.is_fresh(cache_key, input_files, output_path):
+                    return self.emit('cached', pair_id, None)
+                input_fingerprints = self.job_cache.fingerprint_inputs(input_files)
+        except OSError as e:
+            self.metrics.update(pair_id, error_summary=str(e))
+            return self.emit('error', pair_id, e)
+
+        self.emit('running', pair_id, {'charsets': list(charsets)})
+        partial_path = partial_path_for(output_path) if output_path else None
+        staged_path = self.staged_path_for(pair_id, partial_path) if partial_path and self.scratch_folder else None
+        try:
+            input_bytes = sum(file_size(path) for path in input_files)
+            started = time.monotonic()
+            returncode, output_tail, cpu_seconds = self.run_mkvmerge(
+                pair_id, with_output_path(command, staged_path) if staged_path else command, input_bytes, started)
+            self.metrics.update(pair_id, wall_seconds=round(time.monotonic() - started, 3), exit_code=returncode,
+                                cpu_seconds=round(cpu_seconds, 3) if cpu_seconds is not None else None,
+                                bytes_read=input_bytes, error_summary=error_summary(output_tail) if returncode else None)
+            if returncode != 0:
+                remove_if_exists(staged_path, partial_path)
+                if self.cancel_event.is_set(): # Terminated by cancel(), not a real failure
+                    return self.emit('cancelled', pair_id, None)
+                error_lines = [line for line in output_tail if "error" in line.lower()]
+                return self.emit('failed', pair_id, subprocess.CalledProcessError(
+                    returncode, command, output="\n".join(output_tail), stderr="\n".join(error_lines)))
+            if partial_path:
+                try:
+                    if staged_path:
+                        with self.move_slots:
+                            shutil.move(staged_path, partial_path)
+                    os.replace(partial_path, output_path)
+                except OSError as e:
+                    remove_if_exists(staged_path, partial_path)
+                    self.metrics.update(pair_id, error_summary=str(e))
+                    return self.emit('error', pair_id, e)
+            if cache_key:
+                self.job_cache.record(cache_key, input_fingerprints, output_path)
+            progress = job_progress(100, input_bytes, time.monotonic() - started) # Includes the move out of the scratch folder
+            self.metrics.update(pair_id, bytes_written=file_size(output_path) if output_path else None,
+                                mb_per_s=round(progress['mb_per_s'], 2))
+            return self.emit('success', pair_id, progress)
+        except FileNotFoundError as e:
+            self.abort_event.set() # No point starting the remaining jobs
+            self.metrics.update(pair_id, error_summary=str(e))
+            return self.emit('mkvmerge_missing', pair_id, e)
+        except Exception as e:
+            remove_if_exists(staged_path, partial_path)
+            self.metrics.update(pair_id, error_summary=str(e))
+            return self.emit('error', pair_id, e)
+
+    def staged_path_for(self, pair_id, partial_path):
+        # Unique per process and pair, so two batches sharing a scratch folder can't collide
+        return os.path.join(self.scratch_folder, f"{os.getpid()}-{pair_id}-{os.path.basename(partial_path)}")
+
+    def run_mkvmerge(self, pair_id, command, input_bytes, started):
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, encoding='utf-8', errors='replace', bufsize=1) as process:
+            # Registered so pause() and cancel() can reach it
+            with self.process_lock:
+                self.processes[pair_id] = process
+                if self.cancel_event.is_set(): # cancel() ran between the job's start and here
+                    process.terminate()
+                elif not self.resume_event.is_set():
+                    self.signal_process(process, getattr(signal, "SIGSTOP", None))
+            try:
+                return self.read_mkvmerge_output(pair_id, process, input_bytes, started)
+            finally:
+                with self.process_lock:
+                    self.processes.pop(pair_id, None)
+
+    def read_mkvmerge_output(self, pair_id, process, input_bytes, started):
+        # Streams mkvmerge's combined output line by line so memory stays bounded no matter how much it prints
+        output_tail = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+        last_percent = -1
+        for line in process.stdout:
+            line = line.strip()
+            match = PROGRESS_PATTERN.search(line)
+            if match:
+                percent = int(match.group(1))
+                if percent != last_percent:
+                    last_percent = percent
+                    self.emit('progress', pair_id, job_progress(percent, input_bytes, time.monotonic() - started))
+            elif line:
+                output_tail.append(line)
+        returncode, cpu_seconds = wait_for_exit(process)
+        return returncode, list(output_tail), cpu_seconds
+
+    def emit(self, event, pair_id, payload):
+        if self.journal and self.batch_id and event in JOURNALED_EVENTS:
+            try:
+                self.journal.record_status(self.batch_id, pair_id, event)
+            except OSError:
+                pass # A full or read-only disk shouldn't fail the job itself
+        if pair_id is not None and event != 'progress':
+            if event == 'running':
+                self.metrics.update(pair_id, status='running')
+            else:
+                self.metrics.finish_job(pair_id, event)
+        self.on_event(event, pair_id, payload)
+        return event
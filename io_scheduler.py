@@ -0,0 +1,129 @@
+import os
+import itertools
+import collections
+
+# Keeps parallel jobs from fighting over the same disk. Each job is tagged with the devices it
+# reads from and writes to (os.stat().st_dev); no device runs more jobs than its limit, and
+# jobs reading from the same device start in path order so that device's reads stay sequential.
+
+ROTATIONAL_DEVICE_JOBS = 1 # A spinning disk seeks between every concurrent reader and writer
+NETWORK_DEVICE_JOBS = 2 # Some overlap hides network latency; more only splits the bandwidth
+NETWORK_FILESYSTEMS = ("nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "afs")
+
+
+def is_rotational_disk(path):
+    # Returns True/False on Linux via sysfs, None when the disk type cannot be determined
+    if not hasattr(os, "major"):
+        return None
+    try:
+        st_dev = os.stat(path).st_dev
+    except OSError:
+        return None
+    sys_path = f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}"
+    # Partitions don't have a queue/ directory, their parent device does
+    for candidate in (os.path.join(sys_path, "queue", "rotational"), os.path.join(sys_path, "..", "queue", "rotational")):
+        try:
+            with open(candidate) as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+
+def is_network_path(path):
+    # True for NFS/SMB-style mounts on Linux and network drives or UNC paths on Windows, None when unknown
+    if os.name == "nt":
+        drive = os.path.splitdrive(os.path.abspath(path))[0]
+        if drive.startswith("\\\\"):
+            return True
+        try:
+            import ctypes
+            return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4 # DRIVE_REMOTE
+        except (ImportError, AttributeError, OSError):
+            return None
+    try:
+        with open("/proc/self/mounts") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return None
+    real_path = os.path.realpath(path)
+    mount_point, fs_type = "", None
+    for candidate, candidate_type in mounts:
+        candidate = candidate.replace("\\040", " ")
+        inside = real_path == candidate or real_path.startswith(candidate.rstrip("/") + "/")
+        if inside and len(candidate) >= len(mount_point):
+            mount_point, fs_type = candidate, candidate_type
+    return fs_type in NETWORK_FILESYSTEMS if fs_type else None
+
+
+def device_job_limit(path, max_jobs):
+    # How many jobs may use the device holding path at the same time
+    if is_rotational_disk(path):
+        return ROTATIONAL_DEVICE_JOBS
+    if is_network_path(path):
+        return NETWORK_DEVICE_JOBS
+    return max_jobs
+
+
+class DeviceScheduler:
+    # Jobs are queued per source device, in path order. next_job() hands out the first queued job whose
+    # devices all have a free slot, taking the source devices in turn so every disk stays busy.
+
+    def __init__(self, max_jobs, per_device_jobs=0):
+        self.max_jobs = max_jobs
+        self.per_device_jobs = per_device_jobs # 0 picks each device's limit from its type
+        self.limits = {}
+        self.active = collections.Counter()
+        self.queues = {} # source device -> [(path, sequence, devices, job)], sorted last-first; dict order is the turn order
+        self.pending = 0
+        self.sequence = itertools.count() # Tie-breaker, so equal paths never compare the jobs themselves
+        self.sorted = True
+
+    def __len__(self):
+        return self.pending
+
+    def device_for(self, path):
+        # st_dev of path (None if it can't be read); the device's limit is worked out the first time it's seen
+        try:
+            device = os.stat(path).st_dev
+        except OSError:
+            return None
+        if device not in self.limits:
+            self.limits[device] = self.per_device_jobs or device_job_limit(path, self.max_jobs)
+        return device
+
+    def add(self, job, read_path, write_path):
+        source, target = self.device_for(read_path), self.device_for(write_path)
+        devices = tuple({device for device in (source, target) if device is not None})
+        self.queues.setdefault(source, []).append((read_path, next(self.sequence), devices, job))
+        self.pending += 1
+        self.sorted = False
+
+    def next_job(self):
+        # Returns (job, devices) with the devices' slots taken, or None if nothing can start right now
+        if not self.sorted:
+            for queue in self.queues.values():
+                queue.sort(reverse=True) # pop() from the end gives path order
+            self.sorted = True
+        for source in list(self.queues):
+            queue = self.queues[source]
+            devices, job = queue[-1][2:]
+            if all(self.active[device] < self.limits[device] for device in devices):
+                queue.pop()
+                del self.queues[source] # Back of the line, so other devices get the next turn
+                if queue:
+                    self.queues[source] = queue
+                self.active.update(devices)
+                self.pending -= 1
+                return job, devices
+        return None
+
+    def drain(self):
+        # Removes and returns every job that hasn't started, as (job, devices)
+        jobs = [(job, devices) for queue in self.queues.values() for _, _, devices, job in reversed(queue)]
+        self.queues = {}
+        self.pending = 0
+        return jobs
+
+    def release(self, devices):
+        self.active.subtract(devices)
@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+
+from embed_engine import path_next_to_config
+from persistent_lru import PersistentLRU
+
+# Persistent record of finished jobs, so re-running a batch can skip pairs whose
+# inputs, mkvmerge arguments and output have not changed since the last success.
+
+DEFAULT_JOB_CACHE_FILE = "job_cache.json"
+HASH_MODES = ("none", "partial", "full")
+PARTIAL_HASH_BYTES = 1024 * 1024 # Read from the start and the end of the file in 'partial' mode
+CACHE_VERSION = 1
+
+
+def stat_or_none(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+class JobCache(PersistentLRU):
+    # Inputs are compared by size+mtime first. When only the mtime differs and hash_mode is not 'none',
+    # the stored content hash decides, so touched-but-identical files still count as unchanged.
+    # Entries are kept in least-recently-used order and evicted beyond max_entries.
+
+    def __init__(self, cache_file=DEFAULT_JOB_CACHE_FILE, hash_mode="partial", max_entries=10000):
+        if hash_mode not in HASH_MODES:
+            raise ValueError(f"hash_mode must be one of {HASH_MODES}, got {hash_mode!r}")
+        self.hash_mode = hash_mode
+        super().__init__(cache_file, CACHE_VERSION, max_entries)
+
+    def job_key(self, command, input_files):
+        # command[0] is the mkvmerge location, which doesn't change what gets written
+        payload = json.dumps([[os.path.abspath(path) for path in input_files], command[1:]])
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def file_hash(self, path):
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            if self.hash_mode == "partial":
+                size = os.fstat(f.fileno()).st_size
+                digest.update(str(size).encode())
+                digest.update(f.read(PARTIAL_HASH_BYTES))
+                if size > 2 * PARTIAL_HASH_BYTES:
+                    f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+                    digest.update(f.read(PARTIAL_HASH_BYTES))
+            else:
+                for chunk in iter(lambda: f.read(PARTIAL_HASH_BYTES), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def fingerprint(self, path):
+        st = os.stat(path)
+        fingerprint = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        if self.hash_mode != "none":
+            fingerprint['hash'] = self.file_hash(path)
+        return fingerprint
+
+    def fingerprint_inputs(self, input_files):
+        # Taken before mkvmerge starts, so the record describes the inputs that were actually muxed
+        return [self.fingerprint(path) for path in input_files]
+
+    def is_fresh(self, key, input_files, output_path):
+        entry = self.get_entry(key)
+        if entry is None:
+            return False
+        output_stat = stat_or_none(output_path)
+        if output_stat is None or [output_stat.st_size, output_stat.st_mtime_ns] != entry['output']:
+            return False
+
+        for path, stored in zip(input_files, entry['inputs']):
+            st = stat_or_none(path)
+            if st is None or st.st_size != stored['size']:
+                return False
+            if st.st_mtime_ns == stored['mtime_ns']:
+                continue
+            if self.hash_mode == "none" or 'hash' not in stored:
+                return False
+            try:
+                if self.file_hash(path) != stored['hash']:
+                    return False
+            except OSError:
+                return False
+            stored['mtime_ns'] = st.st_mtime_ns # Unchanged content; next check can stop at stat()
+
+        self.touch(key)
+        return True
+
+    def record(self, key, input_fingerprints, output_path):
+        output_stat = stat_or_none(output_path)
+        if output_stat is None:
+            return
+        self.put_entry(key, {'inputs': input_fingerprints, 'output': [output_stat.st_size, output_stat.st_mtime_ns]})
+
+
+def job_cache_from_config(config, config_file):
+    # Returns None when skipping is turned off
+    if not config.get("job_cache_enabled", True):
+        return None
+    cache_file = path_next_to_config(config_file, DEFAULT_JOB_CACHE_FILE)
+    hash_mode = config.get("job_cache_hash", "partial")
+    return JobCache(cache_file, hash_mode if hash_mode in HASH_MODES else "partial",
+                    int(config.get("job_cache_max_entries", 10000)))
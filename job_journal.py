@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+# Append-only JSONL record of every batch: one 'batch' line with its settings, one 'job'
+# line per pair, then a 'status' line per state change and a 'close' line when the batch
+# ran to the end. A batch without a 'close' line was interrupted (crash, reboot, kill)
+# and its jobs that never reached success can be resumed.
+
+DEFAULT_JOURNAL_FILE = "job_journal.jsonl"
+FINISHED_STATUSES = ('success', 'cached')
+JOURNALED_EVENTS = ('running', 'success', 'cached', 'failed', 'mkvmerge_missing', 'skipped', 'error')
+
+
+class JobJournal:
+    def __init__(self, journal_file=DEFAULT_JOURNAL_FILE):
+        self.journal_file = journal_file
+        self.lock = threading.Lock()
+
+    def append(self, *records):
+        # One write + fsync per call; a crash can at most leave a torn last line, which read_records skips
+        text = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self.lock:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start_batch(self, pairs, output_folder, lang_code, sub_charset):
+        batch_id = uuid.uuid4().hex
+        # Absolute paths, so a resume works from any working directory
+        records = [{'type': 'batch', 'batch_id': batch_id, 'time': time.time(), 'output_folder': os.path.abspath(output_folder),
+                    'lang_code': lang_code, 'sub_charset': sub_charset}]
+        for pair_id in sorted(pairs):
+            data = pairs[pair_id]
+            record = {'type': 'job', 'batch_id': batch_id, 'pair_id': pair_id,
+                      'video': os.path.abspath(data['video']), 'subtitle': os.path.abspath(data['subtitle'])}
+            if data.get('output'):
+                record['output'] = os.path.abspath(data['output'])
+            if data.get('extra_subtitles'):
+                record['extra_subtitles'] = [dict(track, path=os.path.abspath(track['path'])) for track in data['extra_subtitles']]
+            records.append(record)
+        self.append(*records)
+        return batch_id
+
+    def record_status(self, batch_id, pair_id, status):
+        self.append({'type': 'status', 'batch_id': batch_id, 'pair_id': pair_id, 'status': status, 'time': time.time()})
+
+    def close_batch(self, batch_id):
+        self.append({'type': 'close', 'batch_id': batch_id, 'time': time.time()})
+
+    def read_records(self):
+        records = []
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return records
+
+    def unfinished_batches(self, records=None):
+        # Returns interrupted batches, oldest first, each with only the pairs that still need to run
+        batches = {}
+        for record in self.read_records() if records is None else records:
+            batch = batches.get(record.get('batch_id'))
+            if record.get('type') == 'batch':
+                batches[record['batch_id']] = dict(record, pairs={}, statuses={})
+            elif batch is None:
+                continue
+            elif record['type'] == 'job':
+                batch['pairs'][record['pair_id']] = {key: record[key] for key in ('video', 'subtitle', 'extra_subtitles', 'output')
+                                                  if key in record}
+            elif record['type'] == 'status':
+                batch['statuses'][record['pair_id']] = record['status']
+            elif record['type'] == 'close':
+                del batches[record['batch_id']]
+
+        unfinished = []
+        for batch in batches.values():
+            statuses = batch.pop('statuses')
+            batch['total'] = len(batch['pairs'])
+            batch['pairs'] = {pair_id: data for pair_id, data in batch['pairs'].items()
+                              if statuses.get(pair_id) not in FINISHED_STATUSES}
+            if batch['pairs']:
+                unfinished.append(batch)
+        return unfinished
+
+    def compact(self):
+        # Drops closed batches so the journal doesn't grow forever; replaced atomically. Reading and rewriting
+        # under one lock hold keeps a batch started meanwhile from being dropped.
+        with self.lock:
+            records = self.read_records()
+            keep = {batch['batch_id'] for batch in self.unfinished_batches(records)}
+            records = [record for record in records if record.get('batch_id') in keep]
+            temp_file = self.journal_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.journal_file)
+
+
+def journal_path_for(config_file):
+    from embed_engine import path_next_to_config # Not at the top: embed_engine imports this module
+    return path_next_to_config(config_file, DEFAULT_JOURNAL_FILE)
@@ -0,0 +1,138 @@
+import os
+import csv
+import json
+import time
+import threading
+import collections
+
+# Structured record of one batch run: a row per job (queue wait, mkvmerge wall and CPU time,
+# bytes read and written, exit code, a short error summary) and aggregate stats over the batch.
+# BatchRunner fills it in from its worker threads; export_json / export_csv write the whole run
+# so slow pairs can be found and hardware sized from real numbers.
+
+FIELDS = ("pair_id", "video", "subtitles", "output", "status", "queue_wait_seconds", "wall_seconds",
+          "cpu_seconds", "bytes_read", "bytes_written", "mb_per_s", "exit_code", "error_summary")
+FAILED_STATUSES = ('failed', 'mkvmerge_missing', 'error', 'rejected')
+ERROR_SUMMARY_CHARS = 300
+REPORT_VERSION = 1
+
+
+def percentile(values, fraction):
+    # Linear interpolation between the closest ranks; None for an empty list
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def error_summary(lines):
+    # The lines mkvmerge flagged as errors or warnings, joined and cut to a size that fits a CSV cell
+    flagged = [line for line in lines if "error" in line.lower() or "warning" in line.lower()]
+    text = " | ".join(flagged or lines[-3:])
+    return text[:ERROR_SUMMARY_CHARS] or None
+
+
+class JobMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs = {} # pair_id -> dict with FIELDS
+        self.started = time.time()
+        self.started_monotonic = time.monotonic()
+        self.finished_monotonic = None # When the last job reached a final status
+
+    def add_job(self, pair_id, video, subtitles, output):
+        with self.lock:
+            self.jobs[pair_id] = dict(dict.fromkeys(FIELDS), pair_id=pair_id, video=video, subtitles=list(subtitles),
+                                      output=output, status='queued')
+
+    def update(self, pair_id, **values):
+        with self.lock:
+            job = self.jobs.get(pair_id)
+            if job is not None:
+                job.update(values)
+
+    def finish_job(self, pair_id, status):
+        with self.lock:
+            if pair_id in self.jobs:
+                self.jobs[pair_id]['status'] = status
+            self.finished_monotonic = time.monotonic()
+
+    def rows(self):
+        with self.lock:
+            return [dict(self.jobs[pair_id]) for pair_id in sorted(self.jobs)]
+
+    def summary(self):
+        rows = self.rows()
+        statuses = collections.Counter(row['status'] for row in rows)
+        wall_times = [row['wall_seconds'] for row in rows if row['wall_seconds'] is not None]
+        queue_waits = [row['queue_wait_seconds'] for row in rows if row['queue_wait_seconds'] is not None]
+        cpu_times = [row['cpu_seconds'] for row in rows if row['cpu_seconds'] is not None]
+        bytes_read = sum(row['bytes_read'] or 0 for row in rows if row['status'] == 'success')
+        bytes_written = sum(row['bytes_written'] or 0 for row in rows if row['status'] == 'success')
+        failed = sum(statuses[status] for status in FAILED_STATUSES)
+        attempted = failed + statuses['success'] # Cached, skipped and cancelled jobs didn't get a chance to fail
+        batch_seconds = (self.finished_monotonic or time.monotonic()) - self.started_monotonic
+
+        def rounded(value, digits=3):
+            return round(value, digits) if value is not None else None
+
+        return {
+            'jobs': len(rows),
+            'statuses': dict(statuses),
+            'batch_seconds': rounded(batch_seconds),
+            'job_p50_seconds': rounded(percentile(wall_times, 0.5)),
+            'job_p95_seconds': rounded(percentile(wall_times, 0.95)),
+            'job_max_seconds': rounded(max(wall_times, default=None)),
+            'queue_wait_p95_seconds': rounded(percentile(queue_waits, 0.95)),
+            'cpu_seconds': rounded(sum(cpu_times)) if cpu_times else None,
+            'bytes_read': bytes_read,
+            'bytes_written': bytes_written,
+            'mb_per_s': rounded(bytes_read / (1024 * 1024) / batch_seconds, 2) if batch_seconds > 0 else None,
+            'failure_rate': rounded(failed / attempted, 4) if attempted else None,
+        }
+
+    def summary_lines(self):
+        summary = self.summary()
+        statuses = ", ".join(f"{count} {status}" for status, count in sorted(summary['statuses'].items()))
+        lines = [f"{summary['jobs']} jobs in {summary['batch_seconds']:.1f}s: {statuses}"]
+        if summary['job_p50_seconds'] is not None:
+            lines.append(f"Job time p50 {summary['job_p50_seconds']:.2f}s, p95 {summary['job_p95_seconds']:.2f}s, "
+                         f"max {summary['job_max_seconds']:.2f}s; queue wait p95 {summary['queue_wait_p95_seconds']:.2f}s")
+        throughput = f"{summary['bytes_read'] / 1024 ** 3:.2f} GB read, {summary['bytes_written'] / 1024 ** 3:.2f} GB written"
+        if summary['mb_per_s'] is not None:
+            throughput += f", {summary['mb_per_s']:.1f} MB/s"
+        if summary['cpu_seconds'] is not None:
+            throughput += f", {summary['cpu_seconds']:.1f} CPU seconds"
+        lines.append(throughput)
+        if summary['failure_rate'] is not None:
+            lines.append(f"Failure rate {summary['failure_rate'] * 100:.1f}%")
+        return lines
+
+    def slowest(self, count=5):
+        rows = [row for row in self.rows() if row['wall_seconds'] is not None]
+        return sorted(rows, key=lambda row: row['wall_seconds'], reverse=True)[:count]
+
+    def to_dict(self):
+        return {'version': REPORT_VERSION, 'started': self.started, 'summary': self.summary(), 'jobs': self.rows()}
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def export_csv(self, path):
+        # One row per job; a job's subtitle tracks share one cell, separated by ';'
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for row in self.rows():
+                writer.writerow(dict(row, subtitles=";".join(row['subtitles'])))
+
+    def export(self, path):
+        # Format picked from the file extension: .csv, anything else is JSON
+        if os.path.splitext(path)[1].lower() == ".csv":
+            self.export_csv(path)
+        else:
+            self.export_json(path)
@@ -0,0 +1,62 @@
+import queue
+import logging
+import collections
+import logging.handlers
+
+# Log messages are queued here from any thread and drained in batches by the GUI
+# (or any other consumer), so logging never touches widgets directly. An optional
+# rotating file log is written by a background listener thread.
+
+MAX_PENDING_MESSAGES = 20000 # If the consumer stalls, the oldest undisplayed messages are dropped
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+class LogSink:
+    def __init__(self, max_pending=MAX_PENDING_MESSAGES):
+        # deque.append/popleft are atomic, so worker threads and the Tk thread can share it without a lock
+        self.pending = collections.deque(maxlen=max_pending)
+        self.file_logger = logging.getLogger("subembed")
+        self.file_logger.propagate = False
+        self.file_logger.setLevel(logging.INFO)
+        self.file_listener = None
+        self.log_file = None
+
+    def write(self, message, is_error=False):
+        self.pending.append((message, is_error))
+        if self.file_listener:
+            self.file_logger.log(logging.ERROR if is_error else logging.INFO, message)
+
+    def drain(self, max_messages):
+        messages = []
+        while len(messages) < max_messages:
+            try:
+                messages.append(self.pending.popleft())
+            except IndexError:
+                break
+        return messages
+
+    def set_log_file(self, log_file):
+        # None turns file logging off; otherwise messages are appended to a rotating log file
+        if log_file == self.log_file:
+            return
+        self.close_log_file()
+        if log_file:
+            handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=LOG_FILE_MAX_BYTES,
+                                                           backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            log_queue = queue.Queue()
+            self.file_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            self.file_listener = logging.handlers.QueueListener(log_queue, handler)
+            self.file_listener.start()
+            self.log_file = log_file
+
+    def close_log_file(self):
+        if self.file_listener:
+            self.file_listener.stop() # Flushes whatever is still queued
+            for handler in self.file_listener.handlers:
+                handler.close()
+            self.file_listener = None
+        for handler in list(self.file_logger.handlers):
+            self.file_logger.removeHandler(handler)
+        self.log_file = None
@@ -0,0 +1,61 @@
+import os
+import json
+import threading
+
+# A dict of JSON-serializable entries kept in least-recently-used order and persisted to a
+# versioned JSON file. Shared by job_cache.JobCache and preflight.IdentifyCache.
+
+
+class PersistentLRU:
+    def __init__(self, cache_file, version, max_entries):
+        self.cache_file = cache_file
+        self.version = version # A file written with another version is ignored
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entries = data.get("entries") if data.get("version") == self.version else None
+            self.entries = dict(entries) if isinstance(entries, dict) else {} # A damaged file just starts a new cache
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"version": self.version, "entries": self.entries}
+            temp_file = self.cache_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_file, self.cache_file) # Atomic, a crash never leaves a half-written cache
+            self.dirty = False
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.dirty = True
+
+    def get_entry(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def touch(self, key):
+        # Marks key as most recently used
+        with self.lock:
+            if key in self.entries:
+                self.entries[key] = self.entries.pop(key)
+                self.dirty = True
+
+    def put_entry(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+            self.dirty = True
@@ -0,0 +1,193 @@
+import os
+import json
+import shutil
+import subprocess
+import collections
+import concurrent.futures
+
+from embed_engine import path_next_to_config
+from persistent_lru import PersistentLRU
+
+# Checks a whole batch before any remux starts, so a long run doesn't fail halfway through:
+# missing, empty or unreadable inputs, files mkvmerge can't identify (mkvmerge -J, cached
+# per file), output names that collide inside the batch or with an input, and whether the
+# output disk has room for the estimated outputs.
+
+DEFAULT_IDENTIFY_CACHE_FILE = "identify_cache.json"
+CONFLICT_MODES = ("rename", "reject")
+IDENTIFY_TIMEOUT_SECONDS = 60
+SPACE_MARGIN_BYTES = 64 * 1024 * 1024 # Headroom for container overhead and file system metadata
+CACHE_VERSION = 1
+
+# problems: pair_id -> [messages] for pairs that must not run; renamed: pair_id -> new output path;
+# errors: batch-level messages (nothing should run while there are any)
+PreflightResult = collections.namedtuple("PreflightResult", "problems renamed errors required_bytes free_bytes")
+
+
+class IdentifyCache(PersistentLRU):
+    # mkvmerge -J results by absolute path, valid while the file's size and mtime are unchanged
+
+    def __init__(self, cache_file=DEFAULT_IDENTIFY_CACHE_FILE, max_entries=50000):
+        super().__init__(cache_file, CACHE_VERSION, max_entries)
+
+    def get(self, path, st):
+        entry = self.get_entry(os.path.abspath(path))
+        if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry['info']
+        return None
+
+    def put(self, path, st, info):
+        self.put_entry(os.path.abspath(path), {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'info': info})
+
+
+def identify_file(mkvmerge_path, path):
+    # Runs mkvmerge -J and keeps only what the checks need
+    completed = subprocess.run([mkvmerge_path, "-J", path], capture_output=True, text=True,
+                               encoding='utf-8', errors='replace', timeout=IDENTIFY_TIMEOUT_SECONDS)
+    try:
+        data = json.loads(completed.stdout)
+    except ValueError:
+        message = completed.stdout.strip()[:200] or f"mkvmerge exited with code {completed.returncode}"
+        return {'recognized': False, 'supported': False, 'type': None, 'tracks': [], 'errors': [message]}
+    container = data.get('container') or {}
+    return {'recognized': bool(container.get('recognized')), 'supported': bool(container.get('supported')),
+            'type': container.get('type'), 'tracks': [track.get('type') for track in data.get('tracks', [])],
+            'errors': data.get('errors', [])}
+
+
+def comparable_path(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def free_space(folder):
+    try:
+        return shutil.disk_usage(folder).free
+    except OSError:
+        return None
+
+
+def same_device(path, other_path):
+    try:
+        return os.stat(path).st_dev == os.stat(other_path).st_dev
+    except OSError:
+        return False
+
+
+def unique_output_path(output_path, taken):
+    # "name.mkv" -> "name (2).mkv", "name (3).mkv", ... whichever isn't in taken yet
+    stem, ext = os.path.splitext(output_path)
+    number = 2
+    while comparable_path(f"{stem} ({number}){ext}") in taken:
+        number += 1
+    return f"{stem} ({number}){ext}"
+
+
+class Preflight:
+    def __init__(self, identify_cache=None, on_conflict="rename", identify=True, max_workers=None):
+        if on_conflict not in CONFLICT_MODES:
+            raise ValueError(f"on_conflict must be one of {CONFLICT_MODES}, got {on_conflict!r}")
+        self.identify_cache = identify_cache
+        self.on_conflict = on_conflict # 'rename' appends " (2)" to colliding outputs, 'reject' refuses those pairs
+        self.identify = identify
+        self.max_workers = max_workers
+
+    def check(self, inputs, outputs, output_folder, mkvmerge_path=None, scratch_folder=None, max_concurrent=None):
+        # inputs: pair_id -> (video, subtitle, ...); outputs: pair_id -> planned output path;
+        # scratch_folder: where outputs are staged by up to max_concurrent jobs at a time, if anywhere
+        problems = collections.defaultdict(list)
+        # mkvmerge that can't be started is reported by the jobs themselves, so identification is just skipped
+        identify_with = shutil.which(mkvmerge_path) if self.identify and mkvmerge_path else None
+
+        unique_paths = list(dict.fromkeys(path for paths in inputs.values() for path in paths))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            checked = dict(zip(unique_paths, executor.map(lambda path: self.check_file(path, identify_with), unique_paths)))
+        if self.identify_cache:
+            try:
+                self.identify_cache.save()
+            except OSError:
+                pass
+
+        for pair_id, paths in inputs.items():
+            problems[pair_id] += [checked[path][1] for path in paths if checked[path][1]]
+
+        # No output may overwrite an input or another pair's output
+        taken = {comparable_path(path) for path in unique_paths}
+        renamed = {}
+        for pair_id in sorted(outputs):
+            if problems[pair_id]:
+                continue
+            output_path = outputs[pair_id]
+            if comparable_path(output_path) in taken:
+                if self.on_conflict == "reject":
+                    problems[pair_id].append(f"output {os.path.basename(output_path)} would overwrite an input or another pair's output")
+                    continue
+                output_path = renamed[pair_id] = unique_output_path(output_path, taken)
+            taken.add(comparable_path(output_path))
+
+        # Outputs are about as large as their inputs; a file being replaced gives its space back
+        errors = []
+        required_bytes = 0
+        estimates = []
+        for pair_id, paths in inputs.items():
+            if not problems[pair_id]:
+                estimate = sum(checked[path][0] for path in paths)
+                output_path = renamed.get(pair_id, outputs[pair_id]) # A renamed output doesn't replace the original file
+                existing = os.path.getsize(output_path) if os.path.isfile(output_path) else 0
+                required_bytes += max(0, estimate - existing)
+                estimates.append(estimate)
+        free_bytes = free_space(output_folder)
+        # A staged output stays in the scratch folder until it's moved, and its job holds a worker until then,
+        # so the scratch disk needs room for the largest max_concurrent outputs at once
+        scratch_bytes = sum(sorted(estimates, reverse=True)[:max_concurrent or len(estimates)]) if scratch_folder else 0
+        if scratch_folder and same_device(scratch_folder, output_folder):
+            required_bytes += scratch_bytes
+        elif scratch_folder:
+            scratch_free_bytes = free_space(scratch_folder)
+            if scratch_free_bytes is not None and scratch_bytes + SPACE_MARGIN_BYTES > scratch_free_bytes:
+                errors.append(f"Not enough free space in the scratch folder {scratch_folder}: about {scratch_bytes / 1024 ** 3:.1f} GB "
+                              f"needed, {scratch_free_bytes / 1024 ** 3:.1f} GB free.")
+        if free_bytes is not None and required_bytes + SPACE_MARGIN_BYTES > free_bytes:
+            errors.append(f"Not enough free space in {output_folder}: about {required_bytes / 1024 ** 3:.1f} GB "
+                          f"needed, {free_bytes / 1024 ** 3:.1f} GB free.")
+
+        return PreflightResult({pair_id: messages for pair_id, messages in problems.items() if messages},
+                               renamed, errors, required_bytes, free_bytes)
+
+    def check_file(self, path, mkvmerge_path):
+        # Returns (size, problem message or None)
+        name = os.path.basename(path)
+        try:
+            st = os.stat(path)
+            with open(path, 'rb') as f:
+                f.read(1)
+        except OSError as e:
+            return 0, f"{name}: {e.strerror or e}"
+        if st.st_size == 0:
+            return 0, f"{name} is empty"
+        if not mkvmerge_path:
+            return st.st_size, None
+
+        info = self.identify_cache.get(path, st) if self.identify_cache else None
+        if info is None:
+            try:
+                info = identify_file(mkvmerge_path, path)
+            except subprocess.TimeoutExpired:
+                return st.st_size, f"{name}: mkvmerge -J timed out"
+            except OSError:
+                return st.st_size, None
+            if self.identify_cache:
+                self.identify_cache.put(path, st, info)
+        if not info['recognized']:
+            return st.st_size, f"{name} is not a file type mkvmerge recognizes"
+        if not info['supported']:
+            return st.st_size, f"{name} ({info['type']}) is recognized but not supported by mkvmerge"
+        return st.st_size, None
+
+
+def preflight_from_config(config, config_file):
+    # Returns None when pre-flight checks are turned off
+    if not config.get("preflight_enabled", True):
+        return None
+    cache_file = path_next_to_config(config_file, DEFAULT_IDENTIFY_CACHE_FILE)
+    on_conflict = config.get("output_conflicts", "rename")
+    return Preflight(IdentifyCache(cache_file), on_conflict if on_conflict in CONFLICT_MODES else "rename")
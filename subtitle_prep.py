@@ -0,0 +1,241 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import collections
+import concurrent.futures
+
+from charset_detect import is_image_subtitle
+
+# Fixes text subtitles in-process before they are muxed: decodes them with the detected charset
+# and writes UTF-8 without a BOM, normalizes line endings, optionally shifts all timings and
+# converts .srt to .ass with the house style. Files are streamed line by line, and results go to a
+# content-addressed cache directory (name = hash of the input bytes, charset and options), so a
+# subtitle is only processed again when its content or the options change.
+
+DEFAULT_CACHE_DIR = "subtitle_cache"
+PREP_VERSION = 2 # Bump when the output of the pipeline changes, so old cache entries aren't reused
+HASH_CHUNK_BYTES = 1024 * 1024
+MAX_CACHE_FILES = 5000 # Oldest prepared files are removed beyond this
+OUTPUT_CHARSET = "UTF-8"
+
+ASS_PLAY_RES = (1920, 1080)
+ASS_STYLE_FORMAT = ("Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, "
+                    "StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding")
+# White text with a black outline and soft shadow, bottom centre
+ASS_HOUSE_STYLE = "Default,Arial,56,&H00FFFFFF,&H000000FF,&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,2.5,1,2,60,60,45,1"
+
+SRT_TIMING = re.compile(r"^\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})(.*)$")
+ASS_EVENT = re.compile(r"^(Dialogue|Comment):(\s*[^,]*),(\d+:\d{1,2}:\d{1,2}\.\d{1,3}),(\d+:\d{1,2}:\d{1,2}\.\d{1,3}),(.*)$")
+ASS_TIME = re.compile(r"(\d+):(\d{1,2}):(\d{1,2})\.(\d{1,3})")
+SRT_TAG = re.compile(r"<(/?)([ibu])>", re.IGNORECASE)
+SRT_FONT_TAG = re.compile(r"</?font[^>]*>", re.IGNORECASE)
+
+PrepOptions = collections.namedtuple("PrepOptions", "shift_ms to_ass ass_style", defaults=(0, False, ASS_HOUSE_STYLE))
+# outputs: (path, charset) -> prepared path; failed: (path, charset) -> error message
+PrepResult = collections.namedtuple("PrepResult", "outputs failed processed reused")
+
+
+def to_ms(hours, minutes, seconds, fraction):
+    # fraction is the digits after the separator: "5" is 500 ms, "05" is 50 ms
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, "0")[:3])
+
+
+def split_ms(ms):
+    ms = max(0, ms)
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return hours, minutes, seconds, ms
+
+
+def format_srt_time(ms):
+    hours, minutes, seconds, ms = split_ms(ms)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def format_ass_time(ms):
+    hours, minutes, seconds, ms = split_ms(ms)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{ms // 10:02d}"
+
+
+def read_lines(path, charset):
+    # Universal newlines turn \r\n and \r into \n; a BOM left by the decoder (UTF-16, or UTF-8 named without -sig) is dropped
+    with open(path, 'r', encoding=charset, errors='replace', newline=None) as f:
+        first = True
+        for line in f:
+            line = line.rstrip("\n")
+            if first:
+                line = line.lstrip("\ufeff")
+                first = False
+            yield line
+
+
+def shift_srt(lines, shift_ms):
+    for line in lines:
+        match = SRT_TIMING.match(line)
+        if match:
+            groups = match.groups()
+            line = f"{format_srt_time(to_ms(*groups[0:4]) + shift_ms)} --> {format_srt_time(to_ms(*groups[4:8]) + shift_ms)}{groups[8]}"
+        yield line
+
+
+def shift_ass(lines, shift_ms):
+    for line in lines:
+        match = ASS_EVENT.match(line)
+        if match:
+            kind, layer, start, end, rest = match.groups()
+            start, end = (format_ass_time(to_ms(*ASS_TIME.match(time).groups()) + shift_ms) for time in (start, end))
+            line = f"{kind}:{layer},{start},{end},{rest}"
+        yield line
+
+
+def srt_text_to_ass(text_lines):
+    # Literal braces would open an override block and hide the text; escaped the way ffmpeg does, before the tags are added
+    text = "\\N".join(text_lines).replace("{", "\\{").replace("}", "\\}")
+    text = SRT_TAG.sub(lambda match: f"{{\\{match.group(2).lower()}{'0' if match.group(1) else '1'}}}", text)
+    return SRT_FONT_TAG.sub("", text)
+
+
+def srt_to_ass(lines, ass_style=ASS_HOUSE_STYLE):
+    yield "[Script Info]"
+    yield "ScriptType: v4.00+"
+    yield f"PlayResX: {ASS_PLAY_RES[0]}"
+    yield f"PlayResY: {ASS_PLAY_RES[1]}"
+    yield "WrapStyle: 0"
+    yield "ScaledBorderAndShadow: yes"
+    yield ""
+    yield "[V4+ Styles]"
+    yield f"Format: {ASS_STYLE_FORMAT}"
+    yield f"Style: {ass_style}"
+    yield ""
+    yield "[Events]"
+    yield "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+    timing, text_lines = None, []
+    for line in lines:
+        match = SRT_TIMING.match(line)
+        if match:
+            if text_lines and text_lines[-1].strip().isdigit(): # Cue number of a cue not preceded by a blank line
+                text_lines.pop()
+            if timing and text_lines:
+                yield f"Dialogue: 0,{timing[0]},{timing[1]},Default,,0,0,0,,{srt_text_to_ass(text_lines)}"
+            groups = match.groups()
+            timing, text_lines = (format_ass_time(to_ms(*groups[0:4])), format_ass_time(to_ms(*groups[4:8]))), []
+        elif not line.strip():
+            if timing and text_lines:
+                yield f"Dialogue: 0,{timing[0]},{timing[1]},Default,,0,0,0,,{srt_text_to_ass(text_lines)}"
+            timing, text_lines = None, []
+        elif timing:
+            text_lines.append(line)
+    if timing and text_lines:
+        yield f"Dialogue: 0,{timing[0]},{timing[1]},Default,,0,0,0,,{srt_text_to_ass(text_lines)}"
+
+
+def output_extension(path, options):
+    ext = os.path.splitext(path)[1].lower()
+    return ".ass" if ext == ".srt" and options.to_ass else ext
+
+
+def prepare_lines(path, charset, options):
+    # The whole pipeline as a chain of generators, so a file is never held in memory at once
+    ext = os.path.splitext(path)[1].lower()
+    lines = read_lines(path, charset)
+    if options.shift_ms and ext == ".srt":
+        lines = shift_srt(lines, options.shift_ms)
+    elif options.shift_ms and ext in (".ass", ".ssa"):
+        lines = shift_ass(lines, options.shift_ms)
+    # MicroDVD .sub timings are frame numbers, not times, so those files are only re-encoded
+    if options.to_ass and ext == ".srt":
+        lines = srt_to_ass(lines, options.ass_style)
+    return lines
+
+
+class SubtitlePrep:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, options=None, max_workers=None, max_files=MAX_CACHE_FILES):
+        self.cache_dir = cache_dir
+        self.options = options or PrepOptions()
+        self.max_workers = max_workers
+        self.max_files = max_files
+        self.options_key = json.dumps([PREP_VERSION] + list(self.options))
+
+    def content_key(self, path, charset):
+        digest = hashlib.sha256(f"{self.options_key}\0{charset}\0".encode("utf-8"))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def prepare_file(self, path, charset):
+        # Returns (prepared path, True if it was already in the cache)
+        prepared_path = os.path.join(self.cache_dir, self.content_key(path, charset) + output_extension(path, self.options))
+        if os.path.isfile(prepared_path):
+            return prepared_path, True
+        # Unique per thread, since two inputs with the same content map to the same output
+        temp_path = f"{prepared_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8', newline="\n") as f:
+                for line in prepare_lines(path, charset, self.options):
+                    f.write(line + "\n")
+            os.replace(temp_path, prepared_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return prepared_path, False
+
+    def prepare(self, subtitles):
+        # subtitles: (path, charset) tuples; image subtitles (VobSub .idx/.sub) and files without a charset are left out,
+        # since an .idx must stay next to its .sub and a binary .sub can't be re-encoded
+        os.makedirs(self.cache_dir, exist_ok=True)
+        unique = [subtitle for subtitle in dict.fromkeys(subtitles) if subtitle[1] and not is_image_subtitle(subtitle[0])]
+
+        def prepare_or_error(subtitle):
+            try:
+                return self.prepare_file(*subtitle), None
+            except (OSError, LookupError, ValueError) as e: # LookupError: a fixed charset Python doesn't know
+                return None, str(e)
+
+        outputs, failed, processed, reused = {}, {}, 0, 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for subtitle, (prepared, error) in zip(unique, executor.map(prepare_or_error, unique)):
+                if error:
+                    failed[subtitle] = error
+                    continue
+                outputs[subtitle] = prepared[0]
+                reused += prepared[1]
+                processed += not prepared[1]
+        self.prune(set(outputs.values()))
+        return PrepResult(outputs, failed, processed, reused)
+
+    def prune(self, keep):
+        # Drops the oldest prepared files beyond max_files, never the ones the current batch uses
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_file() and not entry.name.endswith(".tmp")]
+        except OSError:
+            return
+        excess = len(entries) - self.max_files
+        if excess <= 0:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if excess <= 0:
+                break
+            if entry.path not in keep:
+                try:
+                    os.remove(entry.path)
+                    excess -= 1
+                except OSError:
+                    pass
+
+
+def subtitle_prep_from_config(config, config_file):
+    # Returns None when preprocessing is turned off
+    from embed_engine import path_next_to_config # Not at the top: embed_engine imports this module
+    shift_ms = int(config.get("subtitle_shift_ms", 0) or 0)
+    to_ass = bool(config.get("subtitle_to_ass", False))
+    if not (config.get("subtitle_prep_enabled", False) or shift_ms or to_ass):
+        return None
+    return SubtitlePrep(path_next_to_config(config_file, DEFAULT_CACHE_DIR), PrepOptions(shift_ms, to_ass, config.get("ass_style") or ASS_HOUSE_STYLE))
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# The modules under test live at the repository root, next to gen3.py
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture
+def fake_mkvmerge(tmp_path):
+    # bench/fake_mkvmerge.py behind an executable wrapper, as Popen needs one
+    launcher = tmp_path / "mkvmerge"
+    launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(REPO_DIR, "bench", "fake_mkvmerge.py")}" "$@"\n')
+    launcher.chmod(0o755)
+    return str(launcher)
+
+
+@pytest.fixture
+def library(tmp_path):
+    # Two videos with matching .srt subtitles; returns {pair_id: {'video', 'subtitle'}}
+    source = tmp_path / "source"
+    source.mkdir()
+    pairs = {}
+    for pair_id in (1, 2):
+        video, subtitle = source / f"Show.S01E0{pair_id}.mkv", source / f"Show.S01E0{pair_id}.srt"
+        video.write_bytes(b"video" * 2000)
+        subtitle.write_bytes(b"1\n00:00:01,000 --> 00:00:02,000\nhi\n")
+        pairs[pair_id] = {'video': str(video), 'subtitle': str(subtitle)}
+    return pairs
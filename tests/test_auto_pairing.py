@@ -0,0 +1,30 @@
+from auto_pairing import match_files
+
+
+def test_pairs_by_season_and_episode_across_naming_styles():
+    videos = ["/tv/Show.Name.S01E01.1080p.WEB-DL.mkv", "/tv/Show.Name.S01E02.1080p.WEB-DL.mkv"]
+    subtitles = ["/subs/Show Name 1x02.srt", "/subs/Show Name S01E01.fa.srt"]
+    matches, unmatched_videos, unmatched_subtitles = match_files(videos, subtitles)
+    assert [(match.video, match.subtitle) for match in matches] == [(videos[0], subtitles[1]), (videos[1], subtitles[0])]
+    assert unmatched_videos == unmatched_subtitles == []
+
+
+def test_missing_episode_leaves_its_video_unmatched():
+    videos = [f"/tv/Show.S01E0{episode}.mkv" for episode in (1, 2, 3)]
+    subtitles = ["/subs/Show.S01E01.srt", "/subs/Show.S01E03.srt"]
+    matches, unmatched_videos, unmatched_subtitles = match_files(videos, subtitles)
+    assert {match.video: match.subtitle for match in matches} == {videos[0]: subtitles[0], videos[2]: subtitles[1]}
+    assert unmatched_videos == [videos[1]]
+    assert unmatched_subtitles == []
+
+
+def test_other_season_is_not_matched():
+    matches, unmatched_videos, unmatched_subtitles = match_files(["/tv/Show.S01E05.mkv"], ["/subs/Show.S02E05.srt"])
+    assert matches == []
+    assert unmatched_videos == ["/tv/Show.S01E05.mkv"]
+    assert unmatched_subtitles == ["/subs/Show.S02E05.srt"]
+
+
+def test_identical_names_win_with_full_confidence():
+    matches, _, _ = match_files(["/a/Movie.2019.mkv"], ["/b/Movie.2019.srt"])
+    assert [(match.confidence, match.reason) for match in matches] == [(1.0, "name")]
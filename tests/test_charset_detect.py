@@ -0,0 +1,49 @@
+import codecs
+
+import pytest
+
+from charset_detect import detect_charset_from_bytes, detect_charset, detect_charsets, is_image_subtitle
+
+PERSIAN = "سلام، مرحبا بالعالم" # Only letters cp1256 has
+HEBREW = "שלום עולם, זו כתובית"
+
+
+@pytest.mark.parametrize("data, lang_code, expected", [
+    (codecs.BOM_UTF8 + PERSIAN.encode("utf-8"), "per", "UTF-8"),
+    (codecs.BOM_UTF16_LE + "Hello".encode("utf-16-le"), "eng", "UTF-16LE"),
+    ("Hello there, subtitles".encode("utf-16-be"), "eng", "UTF-16BE"),
+    (PERSIAN.encode("utf-8"), "per", "UTF-8"),
+    (PERSIAN.encode("cp1256"), "per", "cp1256"),
+    (HEBREW.encode("cp1255"), "heb", "cp1255"),
+    ("Café crème".encode("cp1252"), "fre", "cp1252"),
+    (b"\x81\x8d\x8f\x90\x9d", "eng", "ISO-8859-1"), # Undefined in cp1252
+    (b"\x00\x00\x01\xba\x44\x00", "eng", None),
+])
+def test_detects_charset_from_bom_utf8_then_language_code_pages(data, lang_code, expected):
+    assert detect_charset_from_bytes(data, lang_code) == expected
+
+
+def test_idx_and_unreadable_files_get_no_charset(tmp_path):
+    (tmp_path / "movie.idx").write_text("# VobSub index file, v7\n")
+    (tmp_path / "a.srt").write_bytes(PERSIAN.encode("cp1256"))
+    assert detect_charset(str(tmp_path / "movie.idx"), "per") is None
+    paths = [str(tmp_path / "a.srt"), str(tmp_path / "missing.srt"), str(tmp_path / "a.srt")]
+    assert detect_charsets(paths, "per") == {paths[0]: "cp1256", paths[1]: None}
+
+
+def test_changed_file_is_detected_again(tmp_path):
+    subtitle = tmp_path / "a.srt"
+    subtitle.write_bytes(PERSIAN.encode("cp1256"))
+    assert detect_charset(str(subtitle), "per") == "cp1256"
+    subtitle.write_bytes(PERSIAN.encode("utf-8"))
+    assert detect_charset(str(subtitle), "per") == "UTF-8"
+
+
+def test_only_binary_sub_files_are_image_subtitles(tmp_path):
+    (tmp_path / "vobsub.sub").write_bytes(b"\x00\x00\x01\xba" + b"\x00" * 100)
+    (tmp_path / "microdvd.sub").write_text("{0}{25}Hello\n")
+    assert is_image_subtitle(str(tmp_path / "movie.IDX"))
+    assert is_image_subtitle(str(tmp_path / "vobsub.sub"))
+    assert not is_image_subtitle(str(tmp_path / "microdvd.sub"))
+    assert not is_image_subtitle(str(tmp_path / "missing.sub"))
+    assert not is_image_subtitle(str(tmp_path / "movie.srt"))
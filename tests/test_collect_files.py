@@ -0,0 +1,31 @@
+import pytest
+
+from embed_engine import VIDEO_EXTENSIONS, SUBTITLE_EXTENSIONS, collect_files
+
+
+def test_folders_and_explicit_files_are_collected(tmp_path):
+    (tmp_path / "a.mkv").write_bytes(b"v")
+    (tmp_path / "notes.nfo").write_bytes(b"n")
+    other = tmp_path / "b.m2ts"
+    other.write_bytes(b"v")
+    assert collect_files([str(tmp_path), str(other)], VIDEO_EXTENSIONS) == sorted([str(tmp_path / "a.mkv"), str(other)])
+
+
+def test_manifest_paths_are_relative_to_the_manifest(tmp_path):
+    (tmp_path / "a.srt").write_bytes(b"s")
+    manifest = tmp_path / "subs.lst"
+    manifest.write_text("# subtitles\n\na.srt\nnotes.nfo\n", encoding="utf-8")
+    assert collect_files([str(manifest)], SUBTITLE_EXTENSIONS) == [str(tmp_path / "a.srt")]
+
+
+def test_binary_file_with_a_manifest_extension_is_rejected(tmp_path):
+    manifest = tmp_path / "videos.txt"
+    manifest.write_bytes(b"\xff\xfe\x00\x81")
+    with pytest.raises(ValueError):
+        collect_files([str(manifest)], VIDEO_EXTENSIONS)
+
+
+@pytest.mark.parametrize("name", ["missing.mkv", "missing.txt", "missing.m2ts"])
+def test_missing_explicit_path_is_reported(tmp_path, name):
+    with pytest.raises(FileNotFoundError):
+        collect_files([str(tmp_path / name)], VIDEO_EXTENSIONS)
@@ -0,0 +1,11 @@
+import embed_cli
+
+
+def test_batch_runs_when_the_journal_folder_is_missing(fake_mkvmerge, tmp_path, library, capsys):
+    source = tmp_path / "source"
+    output = tmp_path / "output"
+    argv = ["-v", str(source), "-s", str(source), "-o", str(output), "--mkvmerge", fake_mkvmerge,
+            "--config", str(tmp_path / "missing" / "config.json")]
+    assert embed_cli.main(argv) == 0
+    assert sorted(path.name for path in output.iterdir()) == ["Show.S01E01.mkv", "Show.S01E02.mkv"]
+    assert "could not compact the job journal" in capsys.readouterr().err
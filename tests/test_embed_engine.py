@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+
+from embed_engine import BatchRunner, build_mkvmerge_command, partial_path_for
+from job_cache import JobCache
+
+
+def make_runner(fake_mkvmerge, tmp_path, events, **kwargs):
+    return BatchRunner(fake_mkvmerge, str(tmp_path / "output"), "eng", 2, on_event=lambda *event: events.append(event),
+                       per_device_jobs=2, **kwargs)
+
+
+def test_job_cache_that_cant_be_saved_only_warns(fake_mkvmerge, tmp_path, library):
+    events = []
+    runner = make_runner(fake_mkvmerge, tmp_path, events, job_cache=JobCache(str(tmp_path / "missing" / "job_cache.json")))
+    results = runner.run(library)
+    assert results == {1: 'success', 2: 'success'}
+    assert all(os.path.isfile(runner.output_path_for(data)) for data in library.values())
+    assert [event for event, pair_id, _ in events if event == 'warning'] == ['warning']
+
+
+def vobsub_pair(tmp_path):
+    (tmp_path / "movie.idx").write_text("# VobSub index file, v7\n")
+    (tmp_path / "movie.sub").write_bytes(b"\x00\x00\x01\xba" + b"\x00" * 100)
+    (tmp_path / "micro.sub").write_text("{0}{25}MicroDVD text\n")
+    (tmp_path / "movie.srt").write_text("1\n00:00:01,000 --> 00:00:02,000\nhi\n")
+    return [{'path': str(tmp_path / name), 'language': "eng", 'charset': charset, 'default': False}
+            for name, charset in (("movie.idx", None), ("movie.sub", "cp1256"), ("micro.sub", None), ("movie.srt", None))]
+
+
+def test_fixed_charset_is_never_given_to_image_subtitles(tmp_path):
+    tracks = vobsub_pair(tmp_path)
+    BatchRunner("mkvmerge", str(tmp_path), "eng", 1, sub_charset="cp1252").subtitle_charsets(tracks)
+    assert [track['charset'] for track in tracks] == [None, None, "cp1252", "cp1252"]
+
+
+def test_detected_charsets_skip_image_subtitles(tmp_path):
+    tracks = vobsub_pair(tmp_path)
+    BatchRunner("mkvmerge", str(tmp_path), "eng", 1).subtitle_charsets(tracks)
+    assert [track['charset'] for track in tracks] == [None, None, "UTF-8", "UTF-8"]
+    command = build_mkvmerge_command("mkvmerge", "movie.mkv", tracks, "out.mkv")
+    assert command.count("--sub-charset") == 2
+
+
+def run_in_thread(runner, pairs):
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(runner.run(pairs)))
+    thread.start()
+    return thread, results
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_cancel_stops_running_jobs_and_removes_partial_outputs(fake_mkvmerge, tmp_path, library, monkeypatch):
+    monkeypatch.setenv("FAKE_MKVMERGE_SECONDS", "30")
+    events = []
+    runner = BatchRunner(fake_mkvmerge, str(tmp_path / "output"), "eng", 1, on_event=lambda *event: events.append(event), per_device_jobs=1)
+    thread, results = run_in_thread(runner, library)
+    wait_for(lambda: ('progress', 1) in [event[:2] for event in events])
+    partial_path = partial_path_for(runner.output_path_for(library[1]))
+    with open(partial_path, 'wb') as f: # As mkvmerge would have started writing it
+        f.write(b"partial")
+    started = time.monotonic()
+    runner.cancel()
+    thread.join(10)
+    assert time.monotonic() - started < 5 # Terminated, not waited for or killed
+    assert results == {1: 'cancelled', 2: 'cancelled'}
+    assert os.listdir(tmp_path / "output") == []
+
+
+def test_pause_holds_back_new_jobs_until_resumed(fake_mkvmerge, tmp_path, library):
+    events = []
+    runner = BatchRunner(fake_mkvmerge, str(tmp_path / "output"), "eng", 1, on_event=lambda *event: events.append(event), per_device_jobs=1)
+    runner.pause()
+    thread, results = run_in_thread(runner, library)
+    time.sleep(0.5)
+    assert runner.is_paused() and [event for event, _, _ in events if event == 'running'] == []
+    runner.resume()
+    thread.join(10)
+    assert results == {1: 'success', 2: 'success'}
+
+
+def test_failed_job_leaves_no_output(fake_mkvmerge, tmp_path, library, monkeypatch):
+    monkeypatch.setenv("FAKE_MKVMERGE_FAIL_RATE", "1")
+    events = []
+    runner = make_runner(fake_mkvmerge, tmp_path, events)
+    assert runner.run(library) == {1: 'failed', 2: 'failed'}
+    assert os.listdir(tmp_path / "output") == []
+    assert "simulated mkvmerge failure" in [payload for event, _, payload in events if event == 'failed'][0].stderr
@@ -0,0 +1,38 @@
+from io_scheduler import DeviceScheduler
+
+
+class FakeDeviceScheduler(DeviceScheduler):
+    # The device is the first path component, so no real disks are needed
+    def device_for(self, path):
+        device = path.split("/")[1]
+        self.limits.setdefault(device, self.per_device_jobs)
+        return device
+
+
+def scheduler_with_devices(per_device_jobs, jobs):
+    # jobs: (name, read device, write device)
+    scheduler = FakeDeviceScheduler(max_jobs=4, per_device_jobs=per_device_jobs)
+    for name, read_device, write_device in jobs:
+        scheduler.add(name, f"/{read_device}/{name}", f"/{write_device}/out")
+    return scheduler
+
+
+def test_one_job_per_device_in_path_order():
+    scheduler = scheduler_with_devices(1, [("b", 1, 9), ("a", 1, 9)])
+    job, devices = scheduler.next_job()
+    assert job == "a"
+    assert scheduler.next_job() is None # Both of a's devices are busy
+    scheduler.release(devices)
+    assert scheduler.next_job()[0] == "b"
+    assert len(scheduler) == 0
+
+
+def test_source_devices_take_turns():
+    scheduler = scheduler_with_devices(2, [("a1", 1, 9), ("a2", 1, 9), ("b1", 2, 8)])
+    assert [scheduler.next_job()[0] for _ in range(2)] == ["a1", "b1"]
+
+
+def test_drain_returns_every_queued_job():
+    scheduler = scheduler_with_devices(1, [("a", 1, 9), ("b", 2, 8)])
+    assert sorted(job for job, _ in scheduler.drain()) == ["a", "b"]
+    assert len(scheduler) == 0 and scheduler.next_job() is None
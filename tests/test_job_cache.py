@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from job_cache import JobCache
+
+
+@pytest.fixture
+def job(tmp_path):
+    video, subtitle, output = tmp_path / "a.mkv", tmp_path / "a.srt", tmp_path / "out.mkv"
+    video.write_bytes(b"video" * 1000)
+    subtitle.write_bytes(b"1\n00:00:01,000 --> 00:00:02,000\nhi\n")
+    output.write_bytes(b"output")
+    return [str(video), str(subtitle)], str(output)
+
+
+def recorded_cache(tmp_path, job, hash_mode="partial"):
+    input_files, output_path = job
+    cache = JobCache(str(tmp_path / "job_cache.json"), hash_mode)
+    key = cache.job_key(["mkvmerge", "-o", output_path] + input_files, input_files)
+    cache.record(key, cache.fingerprint_inputs(input_files), output_path)
+    return cache, key
+
+
+def touch(path, seconds=10):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 10 ** 9))
+
+
+def test_unchanged_inputs_are_fresh(tmp_path, job):
+    cache, key = recorded_cache(tmp_path, job)
+    assert cache.is_fresh(key, *job)
+
+
+def test_touched_but_identical_input_is_fresh_when_hashing(tmp_path, job):
+    cache, key = recorded_cache(tmp_path, job)
+    touch(job[0][1])
+    assert cache.is_fresh(key, *job)
+
+
+def test_touched_input_is_stale_without_hashing(tmp_path, job):
+    cache, key = recorded_cache(tmp_path, job, hash_mode="none")
+    touch(job[0][1])
+    assert not cache.is_fresh(key, *job)
+
+
+def test_changed_input_of_the_same_size_is_stale(tmp_path, job):
+    cache, key = recorded_cache(tmp_path, job)
+    with open(job[0][1], 'r+b') as f:
+        f.write(b"2")
+    touch(job[0][1])
+    assert not cache.is_fresh(key, *job)
+
+
+def test_missing_or_changed_output_is_stale(tmp_path, job):
+    cache, key = recorded_cache(tmp_path, job)
+    with open(job[1], 'ab') as f:
+        f.write(b"more")
+    assert not cache.is_fresh(key, *job)
+    os.remove(job[1])
+    assert not cache.is_fresh(key, *job)
+
+
+def test_entries_survive_a_save_and_reload(tmp_path, job):
+    cache, key = recorded_cache(tmp_path, job)
+    cache.save()
+    assert JobCache(cache.cache_file).is_fresh(key, *job)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, job):
+    input_files, output_path = job
+    cache = JobCache(str(tmp_path / "job_cache.json"), max_entries=2)
+    fingerprints = cache.fingerprint_inputs(input_files)
+    for key in ("a", "b"):
+        cache.record(key, fingerprints, output_path)
+    assert cache.is_fresh("a", input_files, output_path) # "b" is now the oldest
+    cache.record("c", fingerprints, output_path)
+    assert list(cache.entries) == ["a", "c"]
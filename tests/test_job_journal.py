@@ -0,0 +1,67 @@
+import json
+import threading
+
+from job_journal import JobJournal
+
+PAIRS = {1: {'video': "/v/a.mkv", 'subtitle': "/s/a.srt"}, 2: {'video': "/v/b.mkv", 'subtitle': "/s/b.srt"}}
+
+
+def make_journal(tmp_path):
+    return JobJournal(str(tmp_path / "job_journal.jsonl"))
+
+
+def test_interrupted_batch_offers_only_unfinished_pairs(tmp_path):
+    journal = make_journal(tmp_path)
+    batch_id = journal.start_batch(PAIRS, "/out", "per", "auto")
+    journal.record_status(batch_id, 1, 'running')
+    journal.record_status(batch_id, 1, 'success')
+    journal.record_status(batch_id, 2, 'running')
+
+    batches = journal.unfinished_batches()
+    assert [batch['batch_id'] for batch in batches] == [batch_id]
+    assert batches[0]['total'] == 2
+    assert list(batches[0]['pairs']) == [2]
+    assert batches[0]['output_folder'].endswith("out")
+
+
+def test_closed_and_fully_finished_batches_are_not_offered(tmp_path):
+    journal = make_journal(tmp_path)
+    closed = journal.start_batch(PAIRS, "/out", "per", "auto")
+    journal.close_batch(closed)
+    finished = journal.start_batch({1: PAIRS[1]}, "/out", "per", "auto")
+    journal.record_status(finished, 1, 'cached')
+    assert journal.unfinished_batches() == []
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    journal = make_journal(tmp_path)
+    batch_id = journal.start_batch(PAIRS, "/out", "per", "auto")
+    with open(journal.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"type": "status", "batch_id": "' + batch_id) # Crash mid-write
+    assert len(journal.unfinished_batches()[0]['pairs']) == 2
+
+
+def test_compact_keeps_only_unfinished_batches(tmp_path):
+    journal = make_journal(tmp_path)
+    closed = journal.start_batch(PAIRS, "/out", "per", "auto")
+    journal.close_batch(closed)
+    open_batch = journal.start_batch(PAIRS, "/out", "per", "auto")
+    journal.compact()
+
+    with open(journal.journal_file, encoding='utf-8') as f:
+        batch_ids = {json.loads(line)['batch_id'] for line in f}
+    assert batch_ids == {open_batch}
+    assert [batch['batch_id'] for batch in journal.unfinished_batches()] == [open_batch]
+
+
+def test_compact_never_drops_a_batch_started_concurrently(tmp_path):
+    journal = make_journal(tmp_path)
+    for _ in range(20):
+        journal.close_batch(journal.start_batch(PAIRS, "/out", "per", "auto"))
+    started = []
+    compactor = threading.Thread(target=lambda: [journal.compact() for _ in range(20)])
+    compactor.start()
+    for _ in range(20):
+        started.append(journal.start_batch(PAIRS, "/out", "per", "auto"))
+    compactor.join()
+    assert {batch['batch_id'] for batch in journal.unfinished_batches()} == set(started)
@@ -0,0 +1,56 @@
+import csv
+import json
+
+import pytest
+
+from job_metrics import JobMetrics, percentile, error_summary
+
+
+def test_percentile_of_nothing_is_none():
+    assert percentile([], 0.5) is None
+
+
+@pytest.mark.parametrize("values, fraction, expected", [
+    ([7], 0.95, 7),
+    ([4, 1, 3, 2], 0.5, 2.5),
+    ([1, 2, 3, 4, 5], 0.95, 4.8),
+    ([1, 2, 3, 4, 5], 1.0, 5),
+    ([1, 2, 3, 4, 5], 0.0, 1),
+])
+def test_percentile_interpolates_between_ranks(values, fraction, expected):
+    assert percentile(values, fraction) == pytest.approx(expected)
+
+
+def test_error_summary_prefers_flagged_lines():
+    assert error_summary(["Progress: 10%", "Warning: odd track", "Error: bad file"]) == "Warning: odd track | Error: bad file"
+    assert error_summary(["a", "b", "c", "d"]) == "b | c | d"
+    assert error_summary([]) is None
+
+
+def make_metrics():
+    metrics = JobMetrics()
+    for pair_id, status, seconds in ((1, 'success', 2.0), (2, 'failed', 1.0), (3, 'cached', None)):
+        metrics.add_job(pair_id, f"/v/{pair_id}.mkv", [f"/s/{pair_id}.srt", f"/s/{pair_id}.ass"], f"/o/{pair_id}.mkv")
+        metrics.update(pair_id, wall_seconds=seconds, bytes_read=1000)
+        metrics.finish_job(pair_id, status)
+    return metrics
+
+
+def test_summary_counts_failures_only_among_attempted_jobs():
+    summary = make_metrics().summary()
+    assert summary['statuses'] == {'success': 1, 'failed': 1, 'cached': 1}
+    assert summary['failure_rate'] == 0.5
+    assert summary['job_max_seconds'] == 2.0
+    assert summary['bytes_read'] == 1000 # Only successful jobs count toward throughput
+
+
+def test_exports_one_row_per_job(tmp_path):
+    metrics = make_metrics()
+    metrics.export(str(tmp_path / "report.csv"))
+    metrics.export(str(tmp_path / "report.json"))
+    with open(tmp_path / "report.csv", newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['status'] for row in rows] == ['success', 'failed', 'cached']
+    assert rows[0]['subtitles'] == "/s/1.srt;/s/1.ass"
+    with open(tmp_path / "report.json", encoding='utf-8') as f:
+        assert len(json.load(f)['jobs']) == 3
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from persistent_lru import PersistentLRU
+
+
+@pytest.mark.parametrize("content", ['{"version": 1, "entries": 5}', '{"version": 1, "entries": [1, 2]}', '[1, 2]', '{"version"'])
+def test_damaged_file_starts_an_empty_cache(tmp_path, content):
+    cache_file = tmp_path / "cache.json"
+    cache_file.write_text(content)
+    assert PersistentLRU(str(cache_file), 1, 10).entries == {}
+
+
+def test_other_version_is_ignored(tmp_path):
+    cache_file = tmp_path / "cache.json"
+    cache_file.write_text(json.dumps({"version": 0, "entries": {"a": 1}}))
+    assert PersistentLRU(str(cache_file), 1, 10).get_entry("a") is None
+
+
+def test_entries_round_trip_in_recently_used_order(tmp_path):
+    cache = PersistentLRU(str(tmp_path / "cache.json"), 1, 10)
+    for key in ("a", "b", "c"):
+        cache.put_entry(key, {"value": key})
+    cache.touch("a")
+    cache.save()
+    assert list(PersistentLRU(cache.cache_file, 1, 10).entries) == ["b", "c", "a"]
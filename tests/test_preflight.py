@@ -0,0 +1,77 @@
+import pytest
+
+import preflight
+from preflight import Preflight, SPACE_MARGIN_BYTES
+
+
+@pytest.fixture
+def pairs(tmp_path):
+    # Two pairs with 1000 and 3000 byte videos; returns (inputs, outputs)
+    inputs, outputs = {}, {}
+    for pair_id, size in ((1, 1000), (2, 3000)):
+        video, subtitle = tmp_path / f"v{pair_id}.mkv", tmp_path / f"s{pair_id}.srt"
+        video.write_bytes(b"v" * size)
+        subtitle.write_bytes(b"s" * 10)
+        inputs[pair_id] = (str(video), str(subtitle))
+        outputs[pair_id] = str(tmp_path / "out" / f"v{pair_id}.mkv")
+    (tmp_path / "out").mkdir()
+    return inputs, outputs
+
+
+def free_space_of(monkeypatch, free):
+    monkeypatch.setattr(preflight, "free_space", lambda folder: free[folder])
+
+
+def test_missing_and_empty_inputs_reject_only_their_pair(tmp_path, pairs):
+    inputs, outputs = pairs
+    (tmp_path / "s1.srt").write_bytes(b"")
+    inputs[2] = (str(tmp_path / "missing.mkv"), inputs[2][1])
+    result = Preflight(identify=False).check(inputs, outputs, str(tmp_path / "out"))
+    assert result.problems == {1: ["s1.srt is empty"], 2: ["missing.mkv: No such file or directory"]}
+
+
+def test_output_replacing_an_earlier_result_only_needs_the_difference(tmp_path, pairs):
+    inputs, outputs = pairs
+    (tmp_path / "out" / "v1.mkv").write_bytes(b"o" * 500)
+    result = Preflight(identify=False).check(inputs, outputs, str(tmp_path / "out"))
+    assert result.required_bytes == (1010 - 500) + 3010
+
+
+def test_renamed_output_needs_its_full_size(tmp_path, pairs):
+    inputs, outputs = pairs
+    outputs[1] = inputs[1][0] # Would overwrite its own video
+    result = Preflight(identify=False).check(inputs, outputs, str(tmp_path / "out"))
+    assert result.renamed == {1: str(tmp_path / "v1 (2).mkv")}
+    assert result.required_bytes == 1010 + 3010
+
+
+def test_colliding_output_is_rejected_when_asked(tmp_path, pairs):
+    inputs, outputs = pairs
+    outputs[2] = outputs[1]
+    result = Preflight(on_conflict="reject", identify=False).check(inputs, outputs, str(tmp_path / "out"))
+    assert list(result.problems) == [2] and result.renamed == {}
+
+
+def test_not_enough_output_space_is_a_batch_error(tmp_path, pairs, monkeypatch):
+    inputs, outputs = pairs
+    free_space_of(monkeypatch, {str(tmp_path / "out"): SPACE_MARGIN_BYTES + 4000})
+    result = Preflight(identify=False).check(inputs, outputs, str(tmp_path / "out"))
+    assert len(result.errors) == 1 and result.errors[0].startswith("Not enough free space in")
+
+
+def test_scratch_folder_on_another_disk_needs_room_for_the_largest_running_jobs(tmp_path, pairs, monkeypatch):
+    inputs, outputs = pairs
+    scratch = str(tmp_path / "scratch")
+    free_space_of(monkeypatch, {str(tmp_path / "out"): 10 ** 12, scratch: SPACE_MARGIN_BYTES + 3500})
+    monkeypatch.setattr(preflight, "same_device", lambda path, other_path: False)
+    check = Preflight(identify=False).check
+    assert check(inputs, outputs, str(tmp_path / "out"), scratch_folder=scratch, max_concurrent=1).errors == []
+    errors = check(inputs, outputs, str(tmp_path / "out"), scratch_folder=scratch, max_concurrent=2).errors
+    assert len(errors) == 1 and errors[0].startswith(f"Not enough free space in the scratch folder {scratch}")
+
+
+def test_scratch_folder_on_the_output_disk_adds_to_the_output_requirement(tmp_path, pairs, monkeypatch):
+    inputs, outputs = pairs
+    monkeypatch.setattr(preflight, "same_device", lambda path, other_path: True)
+    result = Preflight(identify=False).check(inputs, outputs, str(tmp_path / "out"), scratch_folder=str(tmp_path), max_concurrent=1)
+    assert result.required_bytes == 1010 + 3010 + 3010
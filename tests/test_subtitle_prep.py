@@ -0,0 +1,47 @@
+import os
+
+from subtitle_prep import PrepOptions, SubtitlePrep, srt_to_ass, shift_srt, shift_ass
+
+SRT = ["1", "00:00:01,000 --> 00:00:02,500", "<i>Hello</i> {world}", "second line", "", "2", "00:00:03,000 --> 00:00:04,000", "Bye", ""]
+
+
+def test_srt_to_ass_escapes_literal_braces_and_converts_tags():
+    dialogue = [line for line in srt_to_ass(SRT) if line.startswith("Dialogue:")]
+    assert dialogue == ["Dialogue: 0,0:00:01.00,0:00:02.50,Default,,0,0,0,,{\\i1}Hello{\\i0} \\{world\\}\\Nsecond line",
+                        "Dialogue: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,Bye"]
+
+
+def test_shift_never_goes_below_zero():
+    assert list(shift_srt(["00:00:01,000 --> 00:00:02,000"], -1500)) == ["00:00:00,000 --> 00:00:00,500"]
+    assert list(shift_ass(["Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Hi"], 250)) == \
+        ["Dialogue: 0,0:00:01.25,0:00:02.25,Default,,0,0,0,,Hi"]
+
+
+def test_prepared_file_is_utf8_and_reused_while_unchanged(tmp_path):
+    subtitle = tmp_path / "a.srt"
+    subtitle.write_bytes("1\r\n00:00:01,000 --> 00:00:02,000\r\nسلام\r\n".encode("cp1256"))
+    prep = SubtitlePrep(str(tmp_path / "cache"), PrepOptions(shift_ms=1000))
+    first = prep.prepare([(str(subtitle), "cp1256")])
+    assert (first.processed, first.reused) == (1, 0)
+    prepared = first.outputs[(str(subtitle), "cp1256")]
+    with open(prepared, 'rb') as f:
+        assert f.read().decode("utf-8") == "1\n00:00:02,000 --> 00:00:03,000\nسلام\n"
+    second = prep.prepare([(str(subtitle), "cp1256")])
+    assert (second.processed, second.reused, second.outputs) == (0, 1, first.outputs)
+
+
+def test_image_subtitles_are_never_prepared(tmp_path):
+    (tmp_path / "movie.idx").write_text("# VobSub index file, v7\n")
+    (tmp_path / "movie.sub").write_bytes(b"\x00\x00\x01\xba" + b"\x00" * 100)
+    result = SubtitlePrep(str(tmp_path / "cache")).prepare([(str(tmp_path / "movie.idx"), "cp1256"),
+                                                            (str(tmp_path / "movie.sub"), "cp1256")])
+    assert result.outputs == result.failed == {}
+    assert os.listdir(tmp_path / "cache") == []
+
+
+def test_unknown_charset_fails_only_that_file(tmp_path):
+    subtitle = tmp_path / "a.srt"
+    subtitle.write_text("1\n00:00:01,000 --> 00:00:02,000\nhi\n")
+    result = SubtitlePrep(str(tmp_path / "cache")).prepare([(str(subtitle), "no-such-charset"), (str(subtitle), "UTF-8")])
+    assert list(result.failed) == [(str(subtitle), "no-such-charset")]
+    assert list(result.outputs) == [(str(subtitle), "UTF-8")]
@@ -0,0 +1,121 @@
+import tkinter as tk
+import tkinter.font as tkfont
+import customtkinter as ctk
+
+# Text rows drawn on a canvas, only for the rows currently on screen. The list content
+# lives in the caller: row_text(index) is asked for a row's text when it becomes
+# visible, so adding, removing or updating entries costs O(visible rows), not O(n).
+
+BG_COLOR = "#1D1E1E" # Matches CTkTextbox in dark mode
+TEXT_COLOR = "#DCE4EE"
+EMPTY_TEXT_COLOR = "gray50"
+SELECTED_COLOR = "gray20"
+TEXT_PADDING = 4
+
+
+class VirtualListView(ctk.CTkFrame):
+    def __init__(self, master, row_text, on_select=None, font=("Courier New", 9), empty_text="", **kwargs):
+        super().__init__(master, **kwargs)
+        self.row_text = row_text
+        self.on_select = on_select
+        self.empty_text = empty_text
+        self.row_count = 0
+        self.first_row = 0
+        self.selected_index = None
+        self.row_items = []
+
+        self.font = tkfont.Font(font=font)
+        self.row_height = self.font.metrics("linespace") + 2
+
+        self.canvas = tk.Canvas(self, bg=BG_COLOR, highlightthickness=0, height=self.row_height * 8)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.selection_item = self.canvas.create_rectangle(0, 0, 0, 0, fill=SELECTED_COLOR, width=0, state="hidden")
+
+        self.canvas.bind("<Configure>", lambda event: self.render())
+        self.canvas.bind("<ButtonRelease-1>", self.on_click)
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_rows(-1)) # X11 wheel up
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_rows(1)) # X11 wheel down
+
+    def visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def set_row_count(self, row_count):
+        # Call after rows were added or removed; only the visible window is redrawn
+        self.row_count = row_count
+        if self.selected_index is not None and self.selected_index >= row_count:
+            self.selected_index = None
+        self.first_row = max(0, min(self.first_row, row_count - self.visible_rows()))
+        self.render()
+
+    def refresh_row(self, index):
+        # Call after a single row's text changed; does nothing if that row is scrolled out of view
+        slot = index - self.first_row
+        if 0 <= slot < len(self.row_items) and index < self.row_count:
+            self.canvas.itemconfigure(self.row_items[slot], text=self.row_text(index), fill=TEXT_COLOR)
+
+    def render(self):
+        visible = self.visible_rows()
+        while len(self.row_items) < visible:
+            self.row_items.append(self.canvas.create_text(TEXT_PADDING, 0, anchor="nw", font=self.font, fill=TEXT_COLOR))
+        while len(self.row_items) > visible:
+            self.canvas.delete(self.row_items.pop())
+
+        for slot, item in enumerate(self.row_items):
+            index = self.first_row + slot
+            self.canvas.coords(item, TEXT_PADDING, slot * self.row_height + 1)
+            if index < self.row_count:
+                self.canvas.itemconfigure(item, text=self.row_text(index), fill=TEXT_COLOR)
+            elif index == 0:
+                self.canvas.itemconfigure(item, text=self.empty_text, fill=EMPTY_TEXT_COLOR)
+            else:
+                self.canvas.itemconfigure(item, text="")
+        self.render_selection()
+
+        if self.row_count > visible:
+            self.scrollbar.set(self.first_row / self.row_count, (self.first_row + visible) / self.row_count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def render_selection(self):
+        slot = None if self.selected_index is None else self.selected_index - self.first_row
+        if slot is None or not 0 <= slot < len(self.row_items):
+            self.canvas.itemconfigure(self.selection_item, state="hidden")
+            return
+        y = slot * self.row_height
+        self.canvas.coords(self.selection_item, 0, y, self.canvas.winfo_width(), y + self.row_height)
+        self.canvas.itemconfigure(self.selection_item, state="normal")
+
+    def scroll_to(self, first_row):
+        first_row = max(0, min(first_row, self.row_count - self.visible_rows()))
+        if first_row != self.first_row:
+            self.first_row = first_row
+            self.render()
+
+    def scroll_rows(self, rows):
+        self.scroll_to(self.first_row + rows)
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        rows = int(event.delta / 40) if abs(event.delta) >= 40 else event.delta
+        self.scroll_rows(-rows)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.row_count))
+        elif action == "scroll":
+            step = self.visible_rows() if unit == "pages" else 1
+            self.scroll_rows(int(amount) * step)
+
+    def on_click(self, event):
+        index = self.first_row + event.y // self.row_height
+        self.selected_index = index if index < self.row_count else None
+        self.render_selection()
+        if self.on_select:
+            self.on_select(self.selected_index)
+
+    def clear_selection(self):
+        self.selected_index = None
+        self.render_selection()